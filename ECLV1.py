@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client, Client
+from supabase import Client
 import uuid
 from datetime import datetime, timedelta, timezone
 import io
-import requests
+
+from db_client import get_client
+from image_tools import download_images, upload_image, variant_url
+from issue_store import LikeBuffer
 
 # --- 1. Connection ---
 try:
@@ -14,7 +17,7 @@ except:
     URL = "https://sizcmbmkbnlolguiulsv.supabase.co"
     KEY = "sb_publishable_ef9RitB16Z7aD683MVo_5Q_oWsnAsel"
 
-supabase: Client = create_client(URL, KEY)
+supabase: Client = get_client(URL, KEY)
 
 st.set_page_config(page_title="Issue Escalation V4.0", layout="wide")
 
@@ -54,14 +57,17 @@ def load_data():
         return pd.DataFrame()
 
 # --- [เพิ่มใหม่] Logic ฟังก์ชันการกด Like ---
-def update_likes(record_id, current_likes):
-    new_likes = int(current_likes) + 1
-    supabase.table("issue_escalation").update({"likes": new_likes}).eq("id", record_id).execute()
-    st.cache_data.clear()
+@st.cache_resource
+def get_like_buffer():
+    return LikeBuffer(supabase, "increment_issue_likes")
+
+def update_likes(record_id):
+    get_like_buffer().add(record_id)
 
 # --- 4. Excel Export Function ---
 def export_excel_with_images(dataframe):
     output = io.BytesIO()
+    images, failures = download_images(dataframe['image_url'].tolist())
     with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
         df_ex = dataframe.copy()
         now_th = datetime.now(timezone(timedelta(hours=7)))
@@ -88,13 +94,15 @@ def export_excel_with_images(dataframe):
         worksheet.set_default_row(80)
         
         for i, url in enumerate(df_ex['image_url']):
-            if url and url.startswith("http"):
+            if i in images:
                 try:
-                    resp = requests.get(url, timeout=5)
-                    img_data = io.BytesIO(resp.content)
-                    worksheet.insert_image(i + 1, 10, url, {'image_data': img_data, 'x_scale': 0.12, 'y_scale': 0.12, 'x_offset': 5, 'y_offset': 5})
-                except: continue
-    return output.getvalue()
+                    worksheet.insert_image(i + 1, 10, url, {'image_data': io.BytesIO(images[i]), 'x_offset': 5, 'y_offset': 5})
+                except Exception as e:
+                    failures[i] = f"embed failed: {e}"
+            if i in failures:
+                worksheet.write(i + 1, 10, failures[i])
+    failed_rows = [{'ID': df_ex['id_str'].iloc[i], 'Reason': reason} for i, reason in sorted(failures.items())]
+    return output.getvalue(), failed_rows
 
 # --- 5. Header & Refresh Button ---
 col_t, col_r = st.columns([5, 1])
@@ -103,10 +111,12 @@ with col_t:
 with col_r:
     st.write("##") 
     if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
+        load_data.clear()
         st.rerun()
 
 df = load_data()
+if get_like_buffer().error:
+    st.warning(f"⚠️ Likes are not being saved, retrying ({get_like_buffer().error})")
 
 # --- 6. Sidebar Admin ---
 with st.sidebar:
@@ -137,12 +147,10 @@ with st.form("issue_form", clear_on_submit=True):
         if u_name and u_detail:
             img_url = ""
             if up_file:
-                f_name = f"esc_{uuid.uuid4()}.jpg"
-                supabase.storage.from_('images').upload(f_name, up_file.read())
-                img_url = supabase.storage.from_('images').get_public_url(f_name)
+                img_url = upload_image(supabase, 'images', up_file.read(), f"esc_{uuid.uuid4()}")
             # เพิ่ม "likes": 0 ตอนสร้างใหม่
             supabase.table("issue_escalation").insert({"staff_name": u_name, "issue_detail": u_detail, "related_to": u_related, "image_url": img_url, "status": "Open", "likes": 0}).execute()
-            st.cache_data.clear(); st.success("✅ Success!"); st.rerun()
+            load_data.clear(); st.success("✅ Success!"); st.rerun()
 
 # --- 8. Dashboard ---
 if not df.empty:
@@ -158,15 +166,18 @@ if not df.empty:
 
     if f3.button("📥 Download Excel with Photos"):
         with st.spinner("Preparing..."):
-            excel_file = export_excel_with_images(df_f)
+            excel_file, failed_rows = export_excel_with_images(df_f)
             st.download_button("💾 Save Excel", data=excel_file, file_name=f"Report_V40_{datetime.now().strftime('%d%m%Y')}.xlsx")
+            if failed_rows:
+                st.warning(f"⚠️ {len(failed_rows)} image(s) not embedded")
+                st.dataframe(pd.DataFrame(failed_rows), hide_index=True)
 
     now_th = datetime.now(timezone(timedelta(hours=7)))
     for i, r in df_f.reset_index(drop=True).iterrows():
         with st.container():
             c_img, c_info, c_admin = st.columns([1.5, 3.5, 1.5])
             with c_img:
-                if r['image_url']: st.markdown(f'<img src="{r["image_url"]}" class="img-card">', unsafe_allow_html=True)
+                if r['image_url']: st.markdown(f'<img src="{variant_url(r["image_url"], "th")}" class="img-card">', unsafe_allow_html=True)
             with c_info:
                 st.markdown(f"### {r['id']:03d} - {r['staff_name']} <span class='related-tag'>Related: {r['related_to']}</span>", unsafe_allow_html=True)
                 days = (now_th - r['created_at']).days
@@ -183,9 +194,9 @@ if not df.empty:
                 
                 with c_like:
                     # ปุ่ม Like โชว์ยอดไลก์ กดได้ไม่จำกัดครั้ง
-                    like_val = r.get('likes', 0)
-                    if st.button(f"❤️ {int(like_val)}", key=f"like_btn_{r['id']}"):
-                        update_likes(r['id'], like_val)
+                    like_val = get_like_buffer().display(r['id'], r.get('likes', 0))
+                    if st.button(f"❤️ {like_val}", key=f"like_btn_{r['id']}"):
+                        update_likes(r['id'])
                         st.rerun()
 
             with c_admin:
@@ -198,8 +209,8 @@ if not df.empty:
                             supabase.table("issue_escalation").update({"status": new_stat, "updated_at": datetime.now(timezone.utc).isoformat()}).eq("id", r['id']).execute()
                         except:
                             supabase.table("issue_escalation").update({"status": new_stat}).eq("id", r['id']).execute()
-                        st.cache_data.clear(); st.rerun()
+                        load_data.clear(); st.rerun()
                     if b2.button("Delete 🗑️", key=f"del_{r['id']}"):
                         supabase.table("issue_escalation").delete().eq("id", r['id']).execute()
-                        st.cache_data.clear(); st.rerun()
+                        load_data.clear(); st.rerun()
             st.divider()
\ No newline at end of file
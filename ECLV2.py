@@ -1,16 +1,41 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client, Client
+from supabase import Client
 import uuid
 from datetime import datetime, timedelta, timezone
-import io
-import requests
+import os
+import tempfile
+import time
+
+from db_client import get_client, render_request_stats
+from image_tools import upload_image, variant_url
+from issue_store import (
+    LIKES_RPC, SEQ_RPC, SYNC_MAX_AGE, IssueSync, LikeBuffer, PagedIssueQuery, SearchIndex, SequenceAllocator,
+    apply_filters, build_export_frame, export_xlsx_plain, export_xlsx_with_images, format_display_no,
+    iter_issue_pages, stream_export_xlsx,
+)
+from singleflight import Revalidator
+from snapshot_store import backend_from_env
+from tracing import finish_trace, render_section, render_trace_panel, span, start_trace, traced
 
 # =========================
 # 1. CONFIG
 # =========================
 TABLE_NAME = "issue_escalation_v2"
 BUCKET_NAME = "images"
+# Above this many filtered rows the Excel export is streamed to a temp file on click.
+STREAM_EXPORT_ROWS = 5000
+# Prepared image exports are temp files in this folder; ones left by ended sessions
+# are removed after IMAGE_EXPORT_MAX_AGE seconds.
+IMAGE_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "eclv2_image_exports")
+IMAGE_EXPORT_MAX_AGE = 3600
+# Category numbers leased per RPC; 1 keeps P-/D- numbers strictly consecutive.
+CATEGORY_SEQ_BLOCK = 1
+# Default for the sidebar toggle: filter and page on the server instead of loading the table.
+SERVER_SIDE_LIST = False
+# A page load waits at most this long for a background refresh before showing
+# the previous data (and reruns by itself once the refresh lands).
+LOAD_BUDGET_SECONDS = 1.5
 
 try:
     URL = st.secrets["SUPABASE_URL"]
@@ -19,9 +44,10 @@ except Exception:
     URL = "https://sizcmbmkbnlolguiulsv.supabase.co"
     KEY = "sb_publishable_ef9RitB16Z7aD683MVo_5Q_oWsnAsel"
 
-supabase: Client = create_client(URL, KEY)
+supabase: Client = get_client(URL, KEY)
 
 st.set_page_config(page_title="Issue Escalation V2", layout="wide")
+start_trace("ECLV2", st.session_state)
 
 # =========================
 # 2. SESSION STATE
@@ -123,231 +149,160 @@ div[data-testid="stFormSubmitButton"] > button {
 # =========================
 # 4. HELPERS
 # =========================
-@st.cache_data(ttl=30)
-def load_data():
+@st.cache_resource
+def get_issue_sync():
+    # After a restart the last snapshot is served while a delta catches up;
+    # with a shared backend, replicas take turns refreshing it.
+    sync = IssueSync(supabase, TABLE_NAME, snapshot_backend=backend_from_env())
+    sync.restore()
+    return sync
+
+
+@st.cache_resource
+def get_revalidator():
+    return Revalidator(get_issue_sync(), "issues")
+
+
+@traced("load_data", "data")
+def load_data(max_age=SYNC_MAX_AGE, budget=LOAD_BUDGET_SECONDS):
+    # Not st.cache_data: the shared IssueSync frame is patched by writes, so a
+    # rerun sees them at once; deltas are pulled at most every max_age seconds,
+    # on a background thread, while the last good frame is served.
+    # Errors only surface here when there has never been a good frame.
     try:
-        cols = (
-            "id,display_no,category_seq,staff_name,category,issue_detail,"
-            "related_to,image_url,status,likes,created_at,updated_at"
-        )
-        res = (
-            supabase.table(TABLE_NAME)
-            .select(cols)
-            .order("id", desc=True)
-            .execute()
-        )
-        df_raw = pd.DataFrame(res.data)
-
-        if df_raw.empty:
-            return pd.DataFrame()
-
-        if "created_at" in df_raw.columns:
-            df_raw["created_at"] = pd.to_datetime(
-                df_raw["created_at"], utc=True, errors="coerce"
-            ).dt.tz_convert("Asia/Bangkok")
-        else:
-            df_raw["created_at"] = pd.Timestamp.now(tz="Asia/Bangkok")
-
-        if "updated_at" in df_raw.columns:
-            df_raw["updated_at"] = pd.to_datetime(
-                df_raw["updated_at"], utc=True, errors="coerce"
-            ).dt.tz_convert("Asia/Bangkok")
-        else:
-            df_raw["updated_at"] = df_raw["created_at"]
-
-        if "likes" not in df_raw.columns:
-            df_raw["likes"] = 0
-
-        if "category" not in df_raw.columns:
-            df_raw["category"] = ""
-
-        if "related_to" not in df_raw.columns:
-            df_raw["related_to"] = ""
-
-        if "display_no" not in df_raw.columns:
-            df_raw["display_no"] = df_raw["id"].apply(lambda x: f"{x:03d}")
-
-        if "category_seq" not in df_raw.columns:
-            df_raw["category_seq"] = None
-
-        return df_raw
+        return get_revalidator().get(max_age, budget)
 
     except Exception as e:
         st.error(f"Load data error: {e}")
-        return pd.DataFrame()
+        return pd.DataFrame(), -1, -1
 
 
-def update_likes(record_id, current_likes):
-    new_likes = int(current_likes or 0) + 1
-    supabase.table(TABLE_NAME).update({"likes": new_likes}).eq("id", record_id).execute()
-    st.cache_data.clear()
+@st.cache_resource
+def get_page_query():
+    return PagedIssueQuery(supabase, TABLE_NAME)
 
 
-def generate_category_number(category):
-    try:
-        res = (
-            supabase.table(TABLE_NAME)
-            .select("category_seq")
-            .eq("category", category)
-            .order("category_seq", desc=True)
-            .limit(1)
-            .execute()
-        )
+@st.cache_data(ttl=30, show_spinner=False)
+def load_status_counts():
+    return get_page_query().status_counts()
 
-        if res.data and res.data[0].get("category_seq") is not None:
-            next_seq = int(res.data[0]["category_seq"]) + 1
-        else:
-            next_seq = 1
 
-        prefix = "P" if category == "Pending" else "D"
-        display_no = f"{prefix}-{next_seq:03d}"
-        return next_seq, display_no
+@st.cache_resource(max_entries=2, show_spinner=False)
+def get_search_index(search_version, _df):
+    # Built once per search version (likes and other unindexed changes keep
+    # it); _df is not hashed, the version is the key.
+    with span("search_index build", "transform", rows=len(_df)):
+        return SearchIndex(_df)
 
-    except Exception:
-        prefix = "P" if category == "Pending" else "D"
-        return 1, f"{prefix}-001"
 
+@st.cache_resource
+def get_like_buffer():
+    sync = get_issue_sync()
+    return LikeBuffer(
+        supabase, LIKES_RPC,
+        on_flushed=lambda record_id, likes: sync.patch_row(record_id, {"likes": likes})
+    )
 
-@st.cache_data(ttl=300, show_spinner=False)
-def export_excel_plain(dataframe: pd.DataFrame) -> bytes:
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df_ex = dataframe.copy()
-        now_th = datetime.now(timezone(timedelta(hours=7)))
-
-        if "display_no" not in df_ex.columns:
-            df_ex["display_no"] = df_ex["id"].apply(lambda x: f"{x:03d}")
-
-        df_ex["Create Date"] = df_ex["created_at"].dt.strftime("%d-%b-%y")
-        df_ex["Create Time"] = df_ex["created_at"].dt.strftime("%H:%M:%S")
-
-        def calc_status(row):
-            c_date = row["created_at"]
-            if row["status"] == "Closed":
-                return row["updated_at"].strftime("%d-%b-%y"), f"{max(0, (row['updated_at'] - c_date).days)} days"
-            return "Processing", f"{max(0, (now_th - c_date).days)} days"
-
-        df_ex[["Complete Date", "Pending Days"]] = df_ex.apply(
-            lambda x: pd.Series(calc_status(x)), axis=1
-        )
 
-        cols = [
-            "display_no", "staff_name", "category", "issue_detail", "related_to",
-            "status", "likes", "Create Date", "Create Time", "Complete Date", "Pending Days"
-        ]
-        df_final = df_ex[cols]
-        df_final.columns = [
-            "Running No", "Staff Name", "Category", "Detail", "Severity",
-            "Status", "Likes", "Create Date", "Create Time", "Complete Date", "Pending Days"
-        ]
+def update_likes(record_id):
+    get_like_buffer().add(record_id)
 
-        df_final.to_excel(writer, sheet_name="Issue_Report", index=False)
 
-    return output.getvalue()
+@st.cache_resource
+def get_seq_allocator():
+    return SequenceAllocator(supabase, SEQ_RPC, block_size=CATEGORY_SEQ_BLOCK)
 
 
-def export_excel_with_images(dataframe: pd.DataFrame) -> bytes:
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        df_ex = dataframe.copy()
-        now_th = datetime.now(timezone(timedelta(hours=7)))
-
-        if "display_no" not in df_ex.columns:
-            df_ex["display_no"] = df_ex["id"].apply(lambda x: f"{x:03d}")
-
-        df_ex["Create Date"] = df_ex["created_at"].dt.strftime("%d-%b-%y")
-        df_ex["Create Time"] = df_ex["created_at"].dt.strftime("%H:%M:%S")
+def generate_category_number(category):
+    next_seq = get_seq_allocator().next(category)
+    return next_seq, format_display_no(category, next_seq)
 
-        def calc_status(row):
-            c_date = row["created_at"]
-            if row["status"] == "Closed":
-                return row["updated_at"].strftime("%d-%b-%y"), f"{max(0, (row['updated_at'] - c_date).days)} days"
-            return "Processing", f"{max(0, (now_th - c_date).days)} days"
 
-        df_ex[["Complete Date", "Pending Days"]] = df_ex.apply(
-            lambda x: pd.Series(calc_status(x)), axis=1
+@st.cache_data(ttl=300, show_spinner=False)
+def export_excel_plain(dataframe: pd.DataFrame) -> bytes:
+    return export_xlsx_plain(dataframe)
+
+
+def export_excel_with_images(dataframe: pd.DataFrame):
+    # Written to a temp file; the session keeps only its path between reruns.
+    os.makedirs(IMAGE_EXPORT_DIR, exist_ok=True)
+    for entry in os.scandir(IMAGE_EXPORT_DIR):
+        try:
+            if time.time() - entry.stat().st_mtime > IMAGE_EXPORT_MAX_AGE:
+                os.remove(entry.path)
+        except OSError:
+            pass
+    with tempfile.NamedTemporaryFile(dir=IMAGE_EXPORT_DIR, suffix=".xlsx", delete=False) as tmp:
+        _, failed_rows = export_xlsx_with_images(dataframe, fileobj=tmp)
+    return tmp.name, failed_rows
+
+
+def read_image_export(path):
+    # Deferred: the file is read only when the download button is clicked.
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+
+    return read
+
+
+def drop_image_export():
+    path = st.session_state.pop("excel_with_images_path", None)
+    st.session_state.pop("excel_image_failures", None)
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_filtered_rows(search_text, status_filter, category_filter):
+    pages = list(iter_issue_pages(
+        supabase, TABLE_NAME,
+        status=status_filter, category=category_filter, search=search_text
+    ))
+    return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+
+
+def stream_csv_export(search_text, status_filter, category_filter):
+    def build():
+        rows = load_filtered_rows(search_text, status_filter, category_filter)
+        return build_export_frame(rows).to_csv(index=False).encode("utf-8-sig")
+
+    return build
+
+
+def stream_excel_export(search_text, status_filter, category_filter):
+    # Building the workbook holds only one page of rows at a time. The finished
+    # file is still read into bytes by st.download_button and kept in Streamlit's
+    # in-memory media storage until the session drops it: one compressed .xlsx
+    # per exporting session, not rows x users of DataFrames. Streamlit offers no
+    # disk-backed download, and its static folder would make exports public.
+    def build():
+        pages = iter_issue_pages(
+            supabase, TABLE_NAME,
+            status=status_filter, category=category_filter, search=search_text
         )
+        tmp = tempfile.TemporaryFile(suffix=".xlsx")
+        stream_export_xlsx(pages, tmp)
+        tmp.seek(0)
+        return tmp
 
-        cols = [
-            "display_no", "staff_name", "category", "issue_detail", "related_to",
-            "status", "likes", "Create Date", "Create Time", "Complete Date", "Pending Days"
-        ]
-
-        df_final = df_ex[cols]
-        df_final.columns = [
-            "Running No", "Staff Name", "Category", "Detail", "Severity",
-            "Status", "Likes", "Create Date", "Create Time", "Complete Date", "Pending Days"
-        ]
-
-        df_final.to_excel(writer, sheet_name="Issue_Report", index=False)
-
-        worksheet = writer.sheets["Issue_Report"]
-        worksheet.set_column("A:A", 14)
-        worksheet.set_column("B:B", 20)
-        worksheet.set_column("C:C", 12)
-        worksheet.set_column("D:D", 40)
-        worksheet.set_column("E:E", 12)
-        worksheet.set_column("F:F", 12)
-        worksheet.set_column("G:G", 10)
-        worksheet.set_column("H:K", 15)
-        worksheet.write(0, 11, "Image")
-        worksheet.set_default_row(80)
-
-        for i, url in enumerate(df_ex["image_url"]):
-            if url and str(url).startswith("http"):
-                try:
-                    resp = requests.get(url, timeout=4)
-                    resp.raise_for_status()
-                    img_data = io.BytesIO(resp.content)
-                    worksheet.insert_image(
-                        i + 1, 11, url,
-                        {
-                            "image_data": img_data,
-                            "x_scale": 0.12,
-                            "y_scale": 0.12,
-                            "x_offset": 5,
-                            "y_offset": 5
-                        }
-                    )
-                except Exception:
-                    continue
-
-    return output.getvalue()
-
-
-def apply_filters(df, search_text, status_filter, category_filter):
-    df_show = df.copy()
-
-    if search_text:
-        kw = search_text.lower().strip()
-        df_show = df_show[
-            df_show["staff_name"].astype(str).str.lower().str.contains(kw, na=False) |
-            df_show["issue_detail"].astype(str).str.lower().str.contains(kw, na=False) |
-            df_show["related_to"].astype(str).str.lower().str.contains(kw, na=False) |
-            df_show["category"].astype(str).str.lower().str.contains(kw, na=False) |
-            df_show["display_no"].astype(str).str.lower().str.contains(kw, na=False)
-        ]
-
-    if status_filter != "All":
-        df_show = df_show[df_show["status"] == status_filter]
-
-    if category_filter != "All":
-        df_show = df_show[df_show["category"] == category_filter]
-
-    return df_show
+    return build
 
 
 def clear_runtime_cache():
-    st.cache_data.clear()
-    if "excel_with_images_ready" in st.session_state:
-        del st.session_state["excel_with_images_ready"]
+    # After a write: the in-memory frame is already patched, so only views read
+    # straight from the server and this session's prepared export are dropped.
+    drop_image_export()
+    get_page_query().clear()
+    load_status_counts.clear()
 
 
 # =========================
 # 5. HEADER
 # =========================
+render_section("header + data")
 col_t, col_r = st.columns([5, 1])
 
 with col_t:
@@ -356,33 +311,65 @@ with col_t:
 with col_r:
     st.write("##")
     if st.button("🔄 Refresh Data"):
+        load_data(max_age=0, budget=None)
         clear_runtime_cache()
         st.rerun()
 
-df = load_data()
+server_mode = st.session_state.get("server_mode", SERVER_SIDE_LIST)
+
+if server_mode:
+    df, _, search_version = pd.DataFrame(), -1, -1
+    try:
+        status_counts = load_status_counts()
+    except Exception as e:
+        st.error(f"Load data error: {e}")
+        status_counts = {}
+else:
+    df, _, search_version = load_data()
+    status_counts = df["status"].value_counts().to_dict() if not df.empty else {}
+    st.caption(get_revalidator().caption())
+
+    if get_revalidator().refreshing():
+        # Picks up the background refresh once it lands instead of waiting for a click.
+        @st.fragment(run_every=1)
+        def wait_for_refresh():
+            if not get_revalidator().refreshing():
+                st.rerun()
+        wait_for_refresh()
+
+if get_like_buffer().error:
+    st.warning(f"⚠️ Likes are not being saved, retrying ({get_like_buffer().error})")
 
 # =========================
 # 6. ADMIN
 # =========================
+render_section("sidebar")
 with st.sidebar:
     st.header("🔐 Admin Access")
     admin_pwd = st.text_input("Enter Password", type="password")
     is_admin = (admin_pwd == "pm1234")
     if is_admin:
         st.success("Admin Mode ON ✅")
+        render_request_stats()
+        render_trace_panel(st.session_state)
 
     st.markdown("---")
+    st.toggle(
+        "Server-side list (large tables)", value=SERVER_SIDE_LIST, key="server_mode",
+        help="Filter and page in the database instead of loading every row."
+    )
     st.markdown(f"**Current Table:** `{TABLE_NAME}`")
     st.caption("This version is separated from old app/table.")
 
 # =========================
 # 7. SUMMARY CARDS
 # =========================
-if not df.empty:
+render_section("summary cards")
+if status_counts:
     c1, c2, c3 = st.columns(3)
-    op = len(df[df["status"] == "Open"])
-    cl = len(df[df["status"] == "Closed"])
-    can = len(df[df["status"] == "Cancel"])
+    op = status_counts.get("Open", 0)
+    cl = status_counts.get("Closed", 0)
+    can = status_counts.get("Cancel", 0)
 
     c1.markdown(f"<div class='card-open'>OPEN<span class='val-text'>{op}</span></div>", unsafe_allow_html=True)
     c2.markdown(f"<div class='card-closed'>CLOSED<span class='val-text'>{cl}</span></div>", unsafe_allow_html=True)
@@ -393,6 +380,7 @@ st.divider()
 # =========================
 # 8. SUBMIT FORM
 # =========================
+render_section("submit form")
 with st.form("issue_form", clear_on_submit=True):
     col_n, col_s = st.columns([2, 1])
 
@@ -410,17 +398,14 @@ with st.form("issue_form", clear_on_submit=True):
             if up_file:
                 try:
                     ext = up_file.name.split(".")[-1].lower() if "." in up_file.name else "jpg"
-                    f_name = f"esc_v2_{uuid.uuid4()}.{ext}"
-                    supabase.storage.from_(BUCKET_NAME).upload(f_name, up_file.read())
-                    img_url = supabase.storage.from_(BUCKET_NAME).get_public_url(f_name)
+                    img_url = upload_image(supabase, BUCKET_NAME, up_file.read(), f"esc_v2_{uuid.uuid4()}", ext)
                 except Exception as e:
                     st.error(f"Image upload failed: {e}")
                     st.stop()
 
-            category_seq, display_no = generate_category_number(u_category)
-
             try:
-                supabase.table(TABLE_NAME).insert({
+                category_seq, display_no = generate_category_number(u_category)
+                res = supabase.table(TABLE_NAME).insert({
                     "running_no": category_seq,
                     "category_seq": category_seq,
                     "display_no": display_no,
@@ -430,9 +415,11 @@ with st.form("issue_form", clear_on_submit=True):
                     "related_to": u_related,
                     "image_url": img_url,
                     "status": "Open",
-                    "likes": 0
+                    "likes": 0,
+                    "updated_at": datetime.now(timezone.utc).isoformat()
                 }).execute()
 
+                get_issue_sync().apply_upsert(res.data)
                 clear_runtime_cache()
                 st.success(f"✅ Success! New record: {display_no}")
                 st.rerun()
@@ -447,7 +434,8 @@ st.divider()
 # =========================
 # 9. FILTER / EXPORT
 # =========================
-if not df.empty:
+render_section("filter")
+if server_mode or not df.empty:
     c_search, c_status, c_cat, c_page = st.columns([2, 1, 1, 1])
 
     with c_search:
@@ -462,10 +450,28 @@ if not df.empty:
     with c_page:
         page_size_option = st.selectbox("Rows / page", ["All", 10, 20, 30, 50], index=4)
 
-    df_show = apply_filters(df, search_text, status_filter, category_filter)
-    page_size = len(df_show) if page_size_option == "All" else int(page_size_option)
+    if "page_no" not in st.session_state:
+        st.session_state.page_no = 1
 
-    st.markdown(f"### Total Records: {len(df_show)}")
+    if server_mode:
+        # df_show is only the requested page here; n_show is the server's exact count.
+        try:
+            df_show, n_show = get_page_query().fetch(
+                search_text, status_filter, category_filter, st.session_state.page_no,
+                None if page_size_option == "All" else int(page_size_option)
+            )
+        except Exception as e:
+            st.error(f"Load data error: {e}")
+            df_show, n_show = pd.DataFrame(), 0
+    else:
+        df_show = apply_filters(
+            df, search_text, status_filter, category_filter,
+            index=get_search_index(search_version, df)
+        )
+        n_show = len(df_show)
+    page_size = n_show if page_size_option == "All" else int(page_size_option)
+
+    st.markdown(f"### Total Records: {n_show}")
 
     if st.session_state.preview_image_url:
         st.markdown('<div class="preview-box">', unsafe_allow_html=True)
@@ -482,11 +488,15 @@ if not df.empty:
         st.caption("Use the expand icon on the image or browser zoom if you want to inspect more closely.")
         st.markdown('</div>', unsafe_allow_html=True)
 
+    render_section("export")
     st.subheader("📥 Export")
     ex1, ex2, ex3 = st.columns([1.2, 1.2, 1.5])
 
     with ex1:
-        csv_data = df_show.to_csv(index=False).encode("utf-8-sig")
+        if server_mode:
+            csv_data = stream_csv_export(search_text, status_filter, category_filter)
+        else:
+            csv_data = build_export_frame(df_show).to_csv(index=False).encode("utf-8-sig")
         st.download_button(
             label="Export CSV",
             data=csv_data,
@@ -495,35 +505,54 @@ if not df.empty:
         )
 
     with ex2:
-        plain_excel = export_excel_plain(df_show)
-        st.download_button(
-            label="Export Excel (fast)",
-            data=plain_excel,
-            file_name=f"issue_escalation_v2_fast_{datetime.now().strftime('%d%m%Y')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        if server_mode or n_show > STREAM_EXPORT_ROWS:
+            st.download_button(
+                label="Export Excel (streaming)",
+                data=stream_excel_export(search_text, status_filter, category_filter),
+                file_name=f"issue_escalation_v2_fast_{datetime.now().strftime('%d%m%Y')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+            st.caption("Large result: the file is built page by page when you click.")
+        else:
+            plain_excel = export_excel_plain(df_show)
+            st.download_button(
+                label="Export Excel (fast)",
+                data=plain_excel,
+                file_name=f"issue_escalation_v2_fast_{datetime.now().strftime('%d%m%Y')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
 
     with ex3:
         if st.button("Prepare Excel with Images"):
             with st.spinner("Preparing image Excel..."):
-                st.session_state["excel_with_images_ready"] = export_excel_with_images(df_show)
+                df_export = load_filtered_rows(search_text, status_filter, category_filter) if server_mode else df_show
+                drop_image_export()
+                excel_path, failed_rows = export_excel_with_images(df_export)
+                st.session_state["excel_with_images_path"] = excel_path
+                st.session_state["excel_image_failures"] = failed_rows
 
-        if "excel_with_images_ready" in st.session_state:
+        if st.session_state.get("excel_image_failures"):
+            with st.expander(f"⚠️ {len(st.session_state['excel_image_failures'])} image(s) not embedded"):
+                st.dataframe(pd.DataFrame(st.session_state["excel_image_failures"]), hide_index=True)
+
+        if os.path.exists(st.session_state.get("excel_with_images_path", "")):
             st.download_button(
                 label="Download Excel with Images",
-                data=st.session_state["excel_with_images_ready"],
+                data=read_image_export(st.session_state["excel_with_images_path"]),
                 file_name=f"issue_escalation_v2_images_{datetime.now().strftime('%d%m%Y')}.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
 
+    render_section("record cards")
     if page_size_option == "All":
         df_page = df_show.copy()
     else:
-        total_pages = max(1, (len(df_show) + page_size - 1) // page_size)
+        total_pages = max(1, (n_show + page_size - 1) // page_size)
 
-        if "page_no" not in st.session_state:
-            st.session_state.page_no = 1
-        st.session_state.page_no = min(st.session_state.page_no, total_pages)
+        if st.session_state.page_no > total_pages:
+            st.session_state.page_no = total_pages
+            if server_mode:
+                st.rerun()
 
         p1, p2, p3 = st.columns([1, 2, 1])
 
@@ -543,9 +572,12 @@ if not df.empty:
                 st.session_state.page_no += 1
                 st.rerun()
 
-        start_idx = (st.session_state.page_no - 1) * page_size
-        end_idx = start_idx + page_size
-        df_page = df_show.iloc[start_idx:end_idx].copy()
+        if server_mode:
+            df_page = df_show
+        else:
+            start_idx = (st.session_state.page_no - 1) * page_size
+            end_idx = start_idx + page_size
+            df_page = df_show.iloc[start_idx:end_idx].copy()
 
     now_th = datetime.now(timezone(timedelta(hours=7)))
 
@@ -553,15 +585,16 @@ if not df.empty:
         c_img, c_info, c_admin = st.columns([1.2, 4, 2.2])
 
         with c_img:
-            if r.get("image_url") and str(r["image_url"]).startswith("http"):
-                st.image(r["image_url"], width=150)
+            if pd.notna(r.get("image_url")) and str(r["image_url"]).startswith("http"):
+                st.image(variant_url(r["image_url"], "th"), width=150)
                 st.markdown(
                     '<div class="preview-note">Use image expand icon to preview / zoom</div>',
                     unsafe_allow_html=True
                 )
 
         with c_info:
-            record_no = r["display_no"] if r.get("display_no") else f"{r['id']:03d}"
+            record_no = r["display_no"] if pd.notna(r["display_no"]) and r["display_no"] else f"{r['id']:03d}"
+            detail = r["issue_detail"] if pd.notna(r["issue_detail"]) else ""
 
             st.markdown(
                 f"### {record_no} - {r['staff_name']}"
@@ -570,7 +603,7 @@ if not df.empty:
                 unsafe_allow_html=True
             )
 
-            st.write(f"**Detail:** {r['issue_detail']}")
+            st.write(f"**Detail:** {detail}")
             st.markdown(f"Status: **{r['status']}**")
 
             days = (now_th - r["created_at"]).days
@@ -588,9 +621,9 @@ if not df.empty:
 
             with c_like:
                 st.markdown('<div class="like-wrap">', unsafe_allow_html=True)
-                like_val = int(r.get("likes", 0))
+                like_val = get_like_buffer().display(r["id"], r.get("likes", 0))
                 if st.button(f"❤️ {like_val}", key=f"like_btn_{r['id']}"):
-                    update_likes(r["id"], like_val)
+                    update_likes(r["id"])
                     st.rerun()
                 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -618,11 +651,12 @@ if not df.empty:
                 with a1:
                     if st.button("Save Detail 💾", key=f"save_detail_{r['id']}"):
                         try:
-                            supabase.table(TABLE_NAME).update({
+                            res = supabase.table(TABLE_NAME).update({
                                 "issue_detail": edited_detail,
                                 "updated_at": datetime.now(timezone.utc).isoformat()
                             }).eq("id", r["id"]).execute()
 
+                            get_issue_sync().apply_upsert(res.data)
                             clear_runtime_cache()
                             st.success("Detail updated")
                             st.rerun()
@@ -632,11 +666,12 @@ if not df.empty:
                 with a2:
                     if st.button("Confirm Status ✅", key=f"ok_{r['id']}"):
                         try:
-                            supabase.table(TABLE_NAME).update({
+                            res = supabase.table(TABLE_NAME).update({
                                 "status": new_stat,
                                 "updated_at": datetime.now(timezone.utc).isoformat()
                             }).eq("id", r["id"]).execute()
 
+                            get_issue_sync().apply_upsert(res.data)
                             clear_runtime_cache()
                             st.rerun()
                         except Exception as e:
@@ -645,6 +680,7 @@ if not df.empty:
                 if st.button("Delete 🗑️", key=f"del_{r['id']}"):
                     try:
                         supabase.table(TABLE_NAME).delete().eq("id", r["id"]).execute()
+                        get_issue_sync().apply_delete(r["id"])
                         clear_runtime_cache()
                         st.rerun()
                     except Exception as e:
@@ -655,4 +691,6 @@ if not df.empty:
         st.divider()
 
 else:
-    st.info("No data found in issue_escalation_v2.")
\ No newline at end of file
+    st.info("No data found in issue_escalation_v2.")
+
+finish_trace(st.session_state)
\ No newline at end of file
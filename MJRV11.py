@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client, Client
+from supabase import Client
 import plotly.express as px
 import uuid
 from datetime import datetime
 
+from db_client import get_client
+from image_tools import upload_image, variant_url
+
 # --- 1. Connection (รองรับทั้งรันในเครื่อง และ Online) ---
 # หากรันในเครื่องให้แก้เป็น URL และ KEY ตรงๆ ได้เลยครับ
 # หากรันบน Streamlit Cloud ระบบจะดึงจากช่อง Secrets
@@ -15,7 +18,7 @@ except:
     URL = "https://sizcmbmkbnlolguiulsv.supabase.co"
     KEY = "sb_publishable_ef9RitB16Z7aD683MVo_5Q_oWsnAsel"
 
-supabase: Client = create_client(URL, KEY)
+supabase: Client = get_client(URL, KEY)
 
 st.set_page_config(page_title="MEP Progress Tracker V11", layout="wide")
 
@@ -59,9 +62,7 @@ def show_upload_form():
                 if uploaded_file:
                     try:
                         file_ext = uploaded_file.name.split('.')[-1]
-                        file_name = f"{uuid.uuid4()}.{file_ext}"
-                        supabase.storage.from_('images').upload(file_name, uploaded_file.read())
-                        image_url = supabase.storage.from_('images').get_public_url(file_name)
+                        image_url = upload_image(supabase, 'images', uploaded_file.read(), str(uuid.uuid4()), file_ext)
                     except Exception as e:
                         st.error(f"Error อัปโหลดรูป: {e}")
 
@@ -106,7 +107,7 @@ else:
                 cols = st.columns(5) 
                 for idx, (_, row) in enumerate(task_images.iterrows()):
                     with cols[idx % 5]:
-                        st.image(row['image_url'], use_container_width=True)
+                        st.image(variant_url(row['image_url'], "md"), use_container_width=True)
                         st.caption(f"{row['created_at'].strftime('%d/%m/%y')}")
                 st.write("") 
 
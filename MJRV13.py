@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client, Client
+from supabase import Client
 import plotly.express as px
 import uuid
 from datetime import datetime
 
+from db_client import get_client
+from image_tools import upload_image, variant_url
+
 # --- 1. Connection (Security Check) ---
 try:
     URL = st.secrets["https://sizcmbmkbnlolguiulsv.supabase.co"]
@@ -13,7 +16,7 @@ except:
     URL = "https://sizcmbmkbnlolguiulsv.supabase.co"
     KEY = "sb_publishable_ef9RitB16Z7aD683MVo_5Q_oWsnAsel"
 
-supabase: Client = create_client(URL, KEY)
+supabase: Client = get_client(URL, KEY)
 
 st.set_page_config(page_title="MEP Tracker V13", layout="wide")
 
@@ -53,9 +56,7 @@ def show_upload_form():
             else:
                 image_url = ""
                 if uploaded_file:
-                    file_name = f"{uuid.uuid4()}.jpg"
-                    supabase.storage.from_('images').upload(file_name, uploaded_file.read())
-                    image_url = supabase.storage.from_('images').get_public_url(file_name)
+                    image_url = upload_image(supabase, 'images', uploaded_file.read(), str(uuid.uuid4()))
 
                 data = {"task_name": task_name, "update_by": update_by, "status": status, "image_url": image_url}
                 supabase.table("construction_progress").insert(data).execute()
@@ -122,7 +123,7 @@ else:
                     cols = st.columns(5)
                     for i, (_, row) in enumerate(img_data.iterrows()):
                         with cols[i % 5]:
-                            st.image(row['image_url'], use_container_width=True)
+                            st.image(variant_url(row['image_url'], "md"), use_container_width=True)
                             st.caption(f"{row['created_at'].strftime('%d/%m/%y %H:%M')}")
         else:
             st.warning("ไม่พบข้อมูลในช่วงวันที่เลือก")
@@ -1,11 +1,19 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client, Client
+from supabase import Client
 import plotly.express as px
 import uuid
 from datetime import datetime, timedelta, timezone
 import io
 
+from db_client import get_client, render_request_stats
+from image_tools import upload_image, variant_url
+from realtime_feed import ChangeFeed, realtime_url
+from singleflight import Revalidator
+from snapshot_store import backend_from_env
+from tracing import finish_trace, render_section, render_trace_panel, start_trace, traced
+from progress_store import PROGRESS_TABLE, SYNC_MAX_AGE, TASK_TABLE, ProgressSync, build_lookups, group_photos, import_task_master, in_date_range, latest_frame, photo_rows, read_task_sheet, round_qty
+
 # --- 1. Connection ---
 try:
     URL = st.secrets["SUPABASE_URL"]
@@ -14,9 +22,10 @@ except:
     URL = "https://sizcmbmkbnlolguiulsv.supabase.co"
     KEY = "sb_publishable_ef9RitB16Z7aD683MVo_5Q_oWsnAsel"
 
-supabase: Client = create_client(URL, KEY)
+supabase: Client = get_client(URL, KEY)
 
 st.set_page_config(page_title="MEP Tracker V45", layout="wide")
+start_trace("MJRV14", st.session_state)
 
 # --- CSS Styling ---
 st.markdown("""
@@ -59,23 +68,70 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 2. Data Fetching ---
-@st.cache_data(ttl=5)
-def load_all_data():
+# Patch the shared tables from Supabase Realtime events; polling every
+# SYNC_MAX_AGE seconds is the fallback whenever the feed is down, and a slow
+# poll (LIVE_SYNC_MAX_AGE) keeps running while it is live.
+REALTIME_FEED = True
+# How often an open dashboard checks (in-process) for data pushed by the feed
+LIVE_CHECK_SECONDS = 3
+# A page load waits at most this long for a background refresh before showing the previous data
+LOAD_BUDGET_SECONDS = 1.5
+
+@st.cache_resource
+def get_progress_sync():
+    # After a restart the last snapshot is served while a delta catches up;
+    # with a shared backend, replicas take turns refreshing it.
+    sync = ProgressSync(supabase, snapshot_backend=backend_from_env())
+    sync.restore()
+    return sync
+
+@st.cache_resource
+def get_change_feed():
+    sync = get_progress_sync()
+    return ChangeFeed(
+        realtime_url(URL, KEY), KEY, [PROGRESS_TABLE, TASK_TABLE],
+        on_change=sync.apply_change, on_status=sync.set_live, topic="realtime:mjrv14"
+    ).start()
+
+@st.cache_resource
+def get_revalidator():
+    return Revalidator(get_progress_sync(), "progress")
+
+# Not st.cache_data: writes patch the shared ProgressSync, so reruns see them at once.
+# Syncs run in the background while the last good snapshot is served; only a first
+# load that fails shows an error.
+@traced("load_all_data", "data")
+def load_all_data(max_age=SYNC_MAX_AGE, budget=LOAD_BUDGET_SECONDS):
     try:
-        res_prog = supabase.table("construction_progress").select("*").execute()
-        res_task = supabase.table("task_master").select("*").execute()
-        return pd.DataFrame(res_prog.data), pd.DataFrame(res_task.data)
-    except:
-        return pd.DataFrame(), pd.DataFrame()
+        if REALTIME_FEED: get_change_feed()
+        return get_revalidator().get(max_age, budget)
+    except Exception as e:
+        st.error(f"Load data error: {e}")
+        return pd.DataFrame(), pd.DataFrame(), [], None, {}
+
+# Built once per data version; the frame is passed unhashed (leading underscore).
+@st.cache_resource(max_entries=2)
+def get_lookups(version, _df_tasks):
+    return build_lookups(_df_tasks)
+
+@st.cache_resource(max_entries=2)
+def get_photo_rows(version, _df_raw):
+    return photo_rows(_df_raw)
+
+render_section("data")
+df_raw, df_tasks, load_stats, data_ver, latest = load_all_data()
+lookups = get_lookups(data_ver, df_tasks)
+
+for s in load_stats:
+    if s['truncated']:
+        st.warning(f"⚠️ {s['table']}: loaded {s['rows']} of {s['expected']} rows ({s['pages']} pages). Data may be incomplete, press Refresh.")
 
-df_raw, df_tasks = load_all_data()
+# Photos shown per page inside one task of the gallery
+GALLERY_PAGE_SIZE = 10
 
 # Project start date default
 min_date = datetime(2026, 3, 1).date()
 
-if not df_raw.empty:
-    df_raw['created_at'] = pd.to_datetime(df_raw['created_at']).dt.tz_convert('Asia/Bangkok').dt.tz_localize(None)
-
 # --- 3. Function: Upload Form ---
 def show_upload_form(show_dash_btn=False):
     col_t, col_b = st.columns([3, 1])
@@ -87,12 +143,12 @@ def show_upload_form(show_dash_btn=False):
         st.warning("⚠️ No Task Master data found. Admin must import 'Import V1.xlsx' in the sidebar first.")
         return
 
-    cats = sorted(df_tasks['category'].unique().tolist())
+    cats = lookups['categories']
     u_cat = st.selectbox("Select Category", options=[""] + cats)
 
     task_opts = []
     if u_cat:
-        task_opts = df_tasks[df_tasks['category'] == u_cat]['task_name'].tolist()
+        task_opts = lookups['tasks_by_category'].get(u_cat, [])
     
     task_name = st.selectbox("Task Name (Recommended from Excel)", options=[""] + task_opts)
 
@@ -101,14 +157,11 @@ def show_upload_form(show_dash_btn=False):
     u_unit = "%"
     
     if task_name:
-        t_info = df_tasks[df_tasks['task_name'] == task_name].iloc[0]
-        total_max = float(t_info['total_qty'])
-        u_unit = t_info['unit']
-        
-        if not df_raw.empty:
-            last_task = df_raw[df_raw['task_name'] == task_name].sort_values('created_at', ascending=False)
-            if not last_task.empty:
-                current_p = float(last_task.iloc[0]['status'])
+        total_max, u_unit = lookups['task_info'][task_name]
+
+        last_task = latest.get(task_name)
+        if last_task is not None:
+            current_p = float(last_task['status'])
         
         st.info(f"🔍 Current: {current_p} {u_unit} | Total Max: {total_max} {u_unit}")
 
@@ -128,26 +181,27 @@ def show_upload_form(show_dash_btn=False):
                 else:
                     img_url = ""
                     if up_file:
-                        f_name = f"{uuid.uuid4()}.jpg"
-                        supabase.storage.from_('images').upload(f_name, up_file.read())
-                        img_url = supabase.storage.from_('images').get_public_url(f_name)
+                        img_url = upload_image(supabase, 'images', up_file.read(), str(uuid.uuid4()))
                     
                     now_th = datetime.now(timezone(timedelta(hours=7))).isoformat()
-                    supabase.table("construction_progress").insert({
+                    res = supabase.table("construction_progress").insert({
                         "task_name": task_name, "update_by": u_by, 
                         "status": stat, "image_url": img_url,
                         "category": u_cat, "unit": u_unit, "total_qty": total_max,
                         "created_at": now_th
                     }).execute()
-                    st.cache_data.clear(); st.success("Recorded!"); st.rerun()
+                    get_progress_sync().apply_insert(res.data)
+                    st.success("Recorded!"); st.rerun()
             else: st.error("Please fill Name and select a Task")
 
 # --- 4. Main App Logic ---
 page = st.query_params.get("page", "upload")
 
 if page == "upload":
+    render_section("upload form")
     show_upload_form(show_dash_btn=True)
 else:
+    render_section("sidebar")
     with st.sidebar:
         if "admin_logged_in" not in st.session_state: st.session_state.admin_logged_in = False
         if not st.session_state.admin_logged_in:
@@ -160,18 +214,22 @@ else:
             if st.button("🚪 Logout"): st.session_state.admin_logged_in = False; st.rerun()
             st.divider()
             st.subheader("📥 Import Task Master")
+            if "import_msg" in st.session_state: st.success(st.session_state.pop("import_msg"))
             imp_file = st.file_uploader("Upload 'Import V1.xlsx'", type=['xlsx'])
             if imp_file and st.button("Confirm Excel Import"):
-                df_imp = pd.read_excel(imp_file)
-                df_imp = df_imp.iloc[:, 0:4]
-                df_imp.columns = ['task_name', 'category', 'total_qty', 'unit']
-                supabase.table("task_master").delete().neq("id", -1).execute()
-                for _, row in df_imp.iterrows():
-                    supabase.table("task_master").insert(row.to_dict()).execute()
-                st.success("Task Master Updated!"); st.cache_data.clear(); st.rerun()
+                try:
+                    counts = import_task_master(supabase, read_task_sheet(imp_file))
+                except Exception as e:
+                    st.error(f"Import failed: {e}")
+                else:
+                    st.session_state.import_msg = f"Task Master Updated! {counts['added']} added, {counts['changed']} changed, {counts['removed']} removed ({counts['unchanged']} unchanged)"
+                    load_all_data(max_age=0, budget=None); st.rerun()
+            render_request_stats()
+            render_trace_panel(st.session_state)
             st.divider(); show_upload_form(False)
 
     # --- Dashboard View ---
+    render_section("dashboard header")
     # Changed ratio to [5, 1] to make the button column smaller
     col_title, col_refresh = st.columns([5, 1]) 
     with col_title:
@@ -181,10 +239,30 @@ else:
         # Wrap in a div to apply the specific CSS from Step A
         st.markdown('<div class="refresh-container">', unsafe_allow_html=True)
         if st.button("🔄 Refresh"):
-            st.cache_data.clear()
+            load_all_data(max_age=0, budget=None)
             st.rerun()
         st.markdown('</div>', unsafe_allow_html=True)
 
+    if load_stats:
+        st.caption(" | ".join(f"{s['table']}: {s['rows']} rows / {s['pages']} pages" for s in load_stats))
+
+    live = REALTIME_FEED and get_change_feed().live
+    if REALTIME_FEED:
+        feed = get_change_feed()
+        st.caption("🟢 Live updates" if feed.live else f"🟡 Live feed offline, refreshing every {SYNC_MAX_AGE}s" + (f" ({feed.last_error})" if feed.last_error else ""))
+    if not live or get_revalidator().error:
+        st.caption(get_revalidator().caption())
+
+    if REALTIME_FEED or get_revalidator().refreshing():
+        # Reruns this page only when the feed or a background refresh has changed the data it shows.
+        @st.fragment(run_every=LIVE_CHECK_SECONDS)
+        def watch_live_data(shown_version):
+            # Starts a due sync in the background, so an idle page still polls.
+            if get_progress_sync().peek() is not None:
+                get_revalidator().get(SYNC_MAX_AGE, budget=0)
+            if get_progress_sync().version != shown_version: st.rerun()
+        watch_live_data(data_ver)
+
     if not st.session_state.admin_logged_in:
         st.markdown('<a href="/?page=upload" target="_self" style="color:#ff4b4b; text-decoration:none;">⬅️ Back to Upload Photo</a>', unsafe_allow_html=True)
 
@@ -194,14 +272,21 @@ else:
     end_d = c2.date_input("To date", today_th)
 
     if not df_raw.empty:
-        mask = (df_raw['created_at'].dt.date >= start_d) & (df_raw['created_at'].dt.date <= end_d)
-        df_f = df_raw[mask].copy()
+        # The snapshot of latest rows answers "anything in range?" too; history is
+        # only scanned when the range ends before the newest update.
+        df_latest = latest_frame(latest, start_d, end_d)
+        if df_latest is None:
+            df_f = in_date_range(df_raw, start_d, end_d)
+            df_latest = round_qty(df_f.sort_values('created_at', ascending=False).drop_duplicates('task_name'))
+        else:
+            df_latest = df_latest.copy()
 
-        if not df_f.empty:
-            csv_data = df_f.to_csv(index=False).encode('utf-8-sig')
+        if not df_latest.empty:
+            # Built only when the button is clicked.
+            csv_data = lambda: in_date_range(df_raw, start_d, end_d).to_csv(index=False).encode('utf-8-sig')
             st.download_button(label="📥 Export Progress (CSV)", data=csv_data, file_name=f"MEP_Report_{datetime.now().strftime('%Y%m%d')}.csv", mime='text/csv')
 
-            df_latest = df_f.sort_values('created_at', ascending=False).drop_duplicates('task_name')
+            render_section("progress chart")
             df_latest['status'] = pd.to_numeric(df_latest['status'], errors='coerce').fillna(0)
             df_latest['total_qty'] = pd.to_numeric(df_latest['total_qty'], errors='coerce').fillna(1)
             df_latest['pct'] = (df_latest['status'] / df_latest['total_qty']) * 100
@@ -216,13 +301,33 @@ else:
             fig.update_layout(xaxis_title="Completion (%)", height=max(400, len(df_latest)*50), yaxis_title="", margin=dict(l=280, r=60, t=20, b=20), yaxis=dict(autorange="reversed", tickfont=dict(family="Candara", size=16)))
             st.plotly_chart(fig, use_container_width=True)
 
+            render_section("photo gallery")
             st.divider(); st.subheader("📸 Photo Progress")
+            photos = in_date_range(get_photo_rows(data_ver, df_raw), start_d, end_d)
+            photo_idx = group_photos(photos)
             for t in df_latest['task_name'].unique():
-                imgs = df_f[(df_f['task_name'] == t) & (df_f['image_url'].str.startswith('http', na=False))].sort_values('created_at', ascending=False)
-                if not imgs.empty:
-                    st.markdown(f"📍 **Task: {t}**")
+                idx = photo_idx.get(t)
+                if idx is None:
+                    continue
+                # Photos are only sent to the browser for sections the user opens.
+                section = st.expander(f"📍 **Task: {t}** ({len(idx)} photos)", key=f"gal_{t}", on_change="rerun")
+                if not section.open:
+                    continue
+                with section:
+                    n_pages = (len(idx) + GALLERY_PAGE_SIZE - 1) // GALLERY_PAGE_SIZE
+                    pg = min(st.session_state.get(f"gal_pg_{t}", 0), n_pages - 1)
+                    page_rows = photos.iloc[idx[pg * GALLERY_PAGE_SIZE:(pg + 1) * GALLERY_PAGE_SIZE]]
                     cols = st.columns(5)
-                    for i, (_, r) in enumerate(imgs.iterrows()):
+                    for i, r in enumerate(page_rows.to_dict('records')):
                         with cols[i%5]: 
-                            st.image(r['image_url'], use_container_width=True)
-                            st.caption(r['created_at'].strftime('%d/%m %H:%M'))
\ No newline at end of file
+                            st.image(variant_url(r['image_url'], "th"), use_container_width=True)
+                            st.caption(r['created_at'].strftime('%d/%m %H:%M'))
+                    if n_pages > 1:
+                        g1, g2, g3 = st.columns([1, 2, 1])
+                        if g1.button("⬅ Prev", key=f"gal_prev_{t}", disabled=pg <= 0):
+                            st.session_state[f"gal_pg_{t}"] = pg - 1; st.rerun()
+                        g2.caption(f"Page {pg + 1} / {n_pages}")
+                        if g3.button("Next ➡", key=f"gal_next_{t}", disabled=pg >= n_pages - 1):
+                            st.session_state[f"gal_pg_{t}"] = pg + 1; st.rerun()
+
+finish_trace(st.session_state)
\ No newline at end of file
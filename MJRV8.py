@@ -1,14 +1,17 @@
 import streamlit as st
 import pandas as pd
-from supabase import create_client, Client
+from supabase import Client
 import plotly.express as px
 import uuid
 from datetime import datetime
 
+from db_client import get_client
+from image_tools import upload_image, variant_url
+
 # --- 1. Connection ---
 URL = "https://sizcmbmkbnlolguiulsv.supabase.co"
 KEY = "sb_publishable_ef9RitB16Z7aD683MVo_5Q_oWsnAsel"
-supabase: Client = create_client(URL, KEY)
+supabase: Client = get_client(URL, KEY)
 
 st.set_page_config(page_title="MEP Tracker V8", layout="wide")
 
@@ -32,11 +35,8 @@ with st.sidebar:
                 if uploaded_file:
                     try:
                         file_ext = uploaded_file.name.split('.')[-1]
-                        file_name = f"{uuid.uuid4()}.{file_ext}"
-                        # อัปโหลดไฟล์
-                        supabase.storage.from_('images').upload(file_name, uploaded_file.read())
-                        # ดึง URL ของรูปออกมา
-                        image_url = supabase.storage.from_('images').get_public_url(file_name)
+                        # อัปโหลดไฟล์ (ย่อขนาด + ทำรูปเล็ก) แล้วดึง URL ของรูปออกมา
+                        image_url = upload_image(supabase, 'images', uploaded_file.read(), str(uuid.uuid4()), file_ext)
                     except Exception as e:
                         st.error(f"Error Upload: {e}")
 
@@ -79,7 +79,7 @@ if not df_raw.empty:
             for idx, (_, row) in enumerate(task_images.iterrows()):
                 with cols[idx % 6]:
                     # ใช้ width='stretch' เพื่อแก้ Error ในรูป 21
-                    st.image(row['image_url'], width='stretch', caption=row['created_at'].strftime('%d/%m/%y'))
+                    st.image(variant_url(row['image_url'], "md"), width='stretch', caption=row['created_at'].strftime('%d/%m/%y'))
             st.write("") # เว้นบรรทัด
 else:
     st.info("ยังไม่มีข้อมูลในระบบ")
\ No newline at end of file
@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# =========================
+# Seeded synthetic rows for issue_escalation_v2 / task_master / construction_progress
+# =========================
+# Same seed and sizes always give the same rows, so runs are comparable.
+STAFF = [
+    "Puwanai Torpradit", "Zhangxi (Sea)", "Ravicha Thaisiam", "Anu Yaemsajja", "Sakda Suwan",
+    "Chatchai Sripradoo", "Pimchanok Janjamsai", "ภูวนัย ต่อประดิษฐ์", "ศักดา สุวรรณ", "อนุ แย้มสัจจา",
+]
+DETAIL_WORDS = [
+    "pipe", "leak", "duct", "cable", "tray", "valve", "pump", "sprinkler", "chiller", "AHU",
+    "floor", "zone", "ceiling", "riser", "shaft", "insulation", "damper", "panel", "conduit", "drain",
+    "ท่อ", "รั่ว", "งานท่อลม", "สายไฟ", "รางสายไฟ", "วาล์ว", "ปั๊มน้ำ", "หัวสปริงเกอร์", "ฝ้าเพดาน", "ชั้น",
+    "โซน", "ช่องท่อ", "ฉนวน", "แดมเปอร์", "ตู้ไฟ", "ท่อร้อยสาย", "ท่อระบายน้ำ", "ตรวจสอบ", "แก้ไข", "ด่วน",
+]
+TASK_WORDS = [
+    "Chilled water pipe", "Fire sprinkler", "Supply air duct", "Cable tray", "Sanitary pipe",
+    "งานท่อน้ำดี", "งานท่อน้ำทิ้ง", "งานระบบไฟฟ้า", "งานท่อลม", "งานดับเพลิง",
+]
+CATEGORIES = ["Pending", "Defect"]
+STATUSES = ["Open", "Closed", "Cancel"]
+SEVERITY = ["Critical", "Major", "Minor"]
+TASK_CATEGORIES = ["Mechanical", "Electrical", "Plumbing", "Fire Protection", "งานสุขาภิบาล"]
+UNITS = ["m", "pcs", "set", "จุด", "%"]
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _details(rng, n, words=6):
+    picks = rng.integers(0, len(DETAIL_WORDS), size=(n, words))
+    nums = rng.integers(1, 40, size=n)
+    return [" ".join(DETAIL_WORDS[j] for j in row) + f" {k}" for row, k in zip(picks, nums)]
+
+
+def _image_urls(rng, n, image_base, share=0.6):
+    if not image_base:
+        return [""] * n
+    has = rng.random(n) < share
+    # Distinct names for half the photos, repeats for the rest: a warm thumbnail
+    # cache then sees both hits and misses.
+    keys = rng.integers(0, max(1, n // 2), size=n)
+    return [f"{image_base}/p{k}_full.jpg" if h else "" for h, k in zip(has, keys)]
+
+
+def gen_issues(n, seed=0, image_base=None):
+    rng = np.random.default_rng(seed)
+    created = rng.integers(0, 280 * 86400, size=n)
+    updated = created + rng.integers(0, 20 * 86400, size=n)
+    category = rng.choice(CATEGORIES, size=n)
+    status = rng.choice(STATUSES, size=n, p=[0.5, 0.4, 0.1])
+    staff = rng.choice(STAFF, size=n)
+    severity = rng.choice(SEVERITY, size=n)
+    likes = rng.integers(0, 30, size=n)
+    details = _details(rng, n)
+    images = _image_urls(rng, n, image_base)
+    seq = {"Pending": 0, "Defect": 0}
+    rows = []
+    for i in range(n):
+        cat = str(category[i])
+        seq[cat] += 1
+        rows.append({
+            "id": i + 1,
+            "running_no": seq[cat],
+            "display_no": f"{cat[0]}-{seq[cat]:03d}",
+            "category_seq": seq[cat],
+            "staff_name": str(staff[i]),
+            "category": cat,
+            "issue_detail": details[i],
+            "related_to": str(severity[i]),
+            "image_url": images[i],
+            "status": str(status[i]),
+            "likes": int(likes[i]),
+            "created_at": (START + timedelta(seconds=int(created[i]))).isoformat(),
+            "updated_at": (START + timedelta(seconds=int(updated[i]))).isoformat(),
+            "changed_at": (START + timedelta(seconds=int(updated[i]))).isoformat(),
+        })
+    return rows
+
+
+def gen_tasks(n, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    cats = rng.choice(TASK_CATEGORIES, size=n)
+    units = rng.choice(UNITS, size=n)
+    qty = rng.integers(1, 2000, size=n)
+    words = rng.integers(0, len(TASK_WORDS), size=n)
+    return [
+        {
+            "id": i + 1,
+            "task_name": f"{TASK_WORDS[words[i]]} L{i % 40 + 1:02d}-{i + 1:04d}",
+            "category": str(cats[i]),
+            "total_qty": float(qty[i]),
+            "unit": str(units[i]),
+        }
+        for i in range(n)
+    ]
+
+
+def gen_progress(n, tasks, seed=0, image_base=None):
+    rng = np.random.default_rng(seed + 2)
+    pick = rng.integers(0, len(tasks), size=n)
+    created = np.sort(rng.integers(0, 200 * 86400, size=n))
+    staff = rng.choice(STAFF, size=n)
+    frac = rng.random(n)
+    images = _image_urls(rng, n, image_base, share=0.3)
+    rows = []
+    for i in range(n):
+        t = tasks[pick[i]]
+        rows.append({
+            "id": i + 1,
+            "task_name": t["task_name"],
+            "update_by": str(staff[i]),
+            "status": round(float(t["total_qty"]) * float(frac[i]), 1),
+            "image_url": images[i],
+            "category": t["category"],
+            "unit": t["unit"],
+            "total_qty": t["total_qty"],
+            "created_at": (START + timedelta(seconds=int(created[i]))).isoformat(),
+        })
+    return rows
+
+
+def gen_tables(issues=0, progress=0, tasks=None, seed=0, image_base=None):
+    """All three tables, keyed by table name, for ``FakeSupabase(tables=...)``."""
+    tasks = tasks or max(10, min(2000, progress // 50))
+    task_rows = gen_tasks(tasks, seed)
+    return {
+        "issue_escalation_v2": gen_issues(issues, seed, image_base),
+        "task_master": task_rows,
+        "construction_progress": gen_progress(progress, task_rows, seed, image_base),
+    }
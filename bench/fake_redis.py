@@ -0,0 +1,48 @@
+import threading
+import time
+
+# =========================
+# In-memory stand-in for the redis-py client
+# =========================
+# Only what snapshot_store.RedisBackend calls: get, set (nx/px/ex), expire and
+# delete, with expiry checked on access.
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.time():
+            del self.data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self.lock:
+            item = self._live(key)
+            return item[0] if item else None
+
+    def set(self, key, value, nx=False, px=None, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self.lock:
+            if nx and self._live(key) is not None:
+                return None
+            expires = time.time() + px / 1000 if px else time.time() + ex if ex else None
+            self.data[key] = (value, expires)
+            return True
+
+    def expire(self, key, seconds):
+        with self.lock:
+            item = self._live(key)
+            if item is None:
+                return False
+            self.data[key] = (item[0], time.time() + seconds)
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self.data.pop(k, None) is not None for k in keys)
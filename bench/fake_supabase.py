@@ -0,0 +1,238 @@
+import re
+import threading
+import time
+import types
+
+# =========================
+# In-memory stand-in for the supabase-py client
+# =========================
+# Covers what the apps and stores call: table().select/insert/update/upsert/
+# delete with eq/neq/gt/gte/lt/lte/in_/or_(ilike)/order/limit/range, rpc()
+# and storage.from_(). ``latency`` adds a fixed delay per request and
+# ``max_rows`` caps every select like PostgREST's db-max-rows (Supabase: 1000).
+
+
+def _resp(data, count=None):
+    return types.SimpleNamespace(data=data, count=count)
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.filters = []
+        self.op = "select"
+        self.columns = None
+        self.payload = None
+        self.on_conflict = None
+        self.order_by = []
+        self.limit_n = None
+        self.range_ab = None
+        self.count = None
+        self.head = False
+
+    # --- verbs ---
+    def select(self, columns="*", count=None, head=False):
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self.count = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="id", **kwargs):
+        self.op, self.payload, self.on_conflict = "upsert", payload, on_conflict or "id"
+        return self
+
+    def update(self, payload, **kwargs):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.op = "delete"
+        return self
+
+    # --- filters ---
+    def _cmp(self, col, fn):
+        self.filters.append(lambda r: r.get(col) is not None and fn(r[col]))
+        return self
+
+    def eq(self, col, v):
+        self.filters.append(lambda r: r.get(col) == v)
+        return self
+
+    def neq(self, col, v):
+        self.filters.append(lambda r: r.get(col) != v)
+        return self
+
+    def gt(self, col, v):
+        return self._cmp(col, lambda x: x > v)
+
+    def gte(self, col, v):
+        return self._cmp(col, lambda x: x >= v)
+
+    def lt(self, col, v):
+        return self._cmp(col, lambda x: x < v)
+
+    def lte(self, col, v):
+        return self._cmp(col, lambda x: x <= v)
+
+    def in_(self, col, values):
+        values = set(values)
+        self.filters.append(lambda r: r.get(col) in values)
+        return self
+
+    def or_(self, cond):
+        # Only the col.ilike."*kw*" form built by issue_store._search_or:
+        # undo the PostgREST quoting, then the LIKE escapes.
+        unescape = lambda s: re.sub(r"\\(.)", r"\1", s)
+        parts = [(c, unescape(unescape(kw)).lower())
+                 for c, kw in re.findall(r'(\w+)\.ilike\."\*((?:[^"\\]|\\.)*?)\*"', cond)]
+        self.filters.append(lambda r: any(kw in str(r.get(c) or "").lower() for c, kw in parts))
+        return self
+
+    def order(self, col, desc=False):
+        self.order_by.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self
+
+    def range(self, a, b):
+        self.range_ab = (a, b)
+        return self
+
+    # --- execution ---
+    def execute(self):
+        self.client._request()
+        with self.client.lock:
+            rows = self.client.db.setdefault(self.table, [])
+            hits = [r for r in rows if all(f(r) for f in self.filters)]
+            return getattr(self, "_" + self.op)(rows, hits)
+
+    def _select(self, rows, hits):
+        for col, desc in reversed(self.order_by):
+            hits = sorted(hits, key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+        total = len(hits)
+        if self.range_ab:
+            hits = hits[self.range_ab[0]:self.range_ab[1] + 1]
+        if self.limit_n is not None:
+            hits = hits[:self.limit_n]
+        if self.client.max_rows:
+            hits = hits[:self.client.max_rows]
+        if self.head:
+            hits = []
+        if self.columns:
+            hits = [{c: r.get(c) for c in self.columns} for r in hits]
+        else:
+            hits = [dict(r) for r in hits]
+        return _resp(hits, total if self.count else None)
+
+    def _insert(self, rows, hits):
+        out = []
+        for rec in self.payload if isinstance(self.payload, list) else [self.payload]:
+            rec = dict(rec)
+            rec.setdefault("id", self.client._next_id(self.table))
+            rows.append(rec)
+            out.append(dict(rec))
+        return _resp(out)
+
+    def _upsert(self, rows, hits):
+        out = []
+        key = self.on_conflict
+        index = {r.get(key): r for r in rows}
+        for rec in self.payload if isinstance(self.payload, list) else [self.payload]:
+            cur = index.get(rec.get(key))
+            if cur is not None:
+                cur.update(rec)
+                out.append(dict(cur))
+            else:
+                rec = dict(rec)
+                rec.setdefault("id", self.client._next_id(self.table))
+                rows.append(rec)
+                index[rec.get(key)] = rec
+                out.append(dict(rec))
+        return _resp(out)
+
+    def _update(self, rows, hits):
+        for r in hits:
+            r.update(self.payload)
+        return _resp([dict(r) for r in hits])
+
+    def _delete(self, rows, hits):
+        gone = {id(r) for r in hits}
+        self.client.db[self.table] = [r for r in rows if id(r) not in gone]
+        return _resp([dict(r) for r in hits])
+
+
+class FakeBucket:
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def upload(self, path, data, file_options=None):
+        self.client._request()
+        self.client.objects[(self.bucket, path)] = bytes(data)
+        return _resp({"Key": f"{self.bucket}/{path}"})
+
+    def get_public_url(self, path):
+        return f"{self.client.storage_base}/{self.bucket}/{path}"
+
+
+class FakeSupabase:
+    """Drop-in for ``supabase.Client`` backed by lists of dicts per table."""
+
+    def __init__(self, tables=None, latency=0.0, storage_base="http://127.0.0.1/storage", max_rows=1000):
+        self.db = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.objects = {}
+        self.rpcs = {}
+        self.latency = latency
+        self.max_rows = max_rows
+        self.storage_base = storage_base
+        self.requests = 0
+        self.lock = threading.RLock()
+        self.storage = types.SimpleNamespace(from_=lambda bucket: FakeBucket(self, bucket))
+        self._install_default_rpcs()
+
+    def _request(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _next_id(self, table):
+        return max((r.get("id", 0) for r in self.db.get(table, [])), default=0) + 1
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, fn, params=None):
+        def execute():
+            self._request()
+            with self.lock:
+                return _resp(self.rpcs[fn](self, **(params or {})))
+        return types.SimpleNamespace(execute=execute)
+
+    def _install_default_rpcs(self):
+        def increment(table):
+            def fn(client, record_id, n=1):
+                for r in client.db.get(table, []):
+                    if r["id"] == record_id:
+                        r["likes"] = (r.get("likes") or 0) + n
+                        return r["likes"]
+                return None
+            return fn
+
+        def reserve_seq(client, p_category, p_count=1):
+            seqs = client.db.setdefault("issue_category_seq", {})
+            seqs[p_category] = seqs.get(p_category, 0) + p_count
+            return seqs[p_category] - p_count + 1
+
+        self.rpcs["increment_issue_likes_v2"] = increment("issue_escalation_v2")
+        self.rpcs["increment_issue_likes"] = increment("issue_escalation")
+        self.rpcs["reserve_category_seq"] = reserve_seq
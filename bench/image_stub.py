@@ -0,0 +1,74 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+# =========================
+# Local HTTP server standing in for the storage bucket
+# =========================
+# Any GET returns a JPEG sized like the requested variant (*_th.jpg, *_md.jpg,
+# otherwise full size), with an ETag so conditional requests can answer 304.
+SIZES = {"th": (320, 240), "md": (800, 600), "full": (2048, 1536)}
+
+
+def _jpeg(size, seed):
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    img.paste((seed * 37 % 256, 90, 160), (0, 0, size[0] // 3, size[1] // 3))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=80)
+    return out.getvalue()
+
+
+class ImageStub:
+    """``with ImageStub() as stub:`` serves images at ``stub.base_url`` on a free port."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = 0
+        self.not_modified = 0
+        self.bodies = {name: _jpeg(size, i) for i, (name, size) in enumerate(SIZES.items())}
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+                name = next((n for n in ("th", "md") if self.path.endswith(f"_{n}.jpg")), "full")
+                etag = f'"{name}-{hash(self.path) & 0xffffffff:x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    with stub.lock:
+                        stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = stub.bodies[name]
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/storage/v1/object/public/images"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="image-stub")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,84 @@
+import json
+import threading
+from datetime import datetime, timezone
+
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.server import serve
+
+# =========================
+# Local websocket server standing in for Supabase Realtime
+# =========================
+# Speaks the Phoenix channel protocol (JSON v1) as far as realtime_feed uses
+# it: phx_join is acknowledged, heartbeats are answered, ``emit`` pushes a
+# postgres_changes event to every joined channel and ``drop`` closes all
+# connections so the client's reconnect path runs.
+
+
+class RealtimeStub:
+    """``with RealtimeStub() as rt:`` listens at ``rt.url`` on a free port."""
+
+    def __init__(self):
+        self.joins = 0
+        self.heartbeats = 0
+        self.channels = {}
+        self.lock = threading.Lock()
+        self.server = serve(self._handle, "127.0.0.1", 0, compression=None)
+        port = self.server.socket.getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}/realtime/v1/websocket?vsn=1.0.0"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="realtime-stub")
+
+    def _reply(self, ws, msg, response):
+        ws.send(json.dumps({
+            "topic": msg["topic"], "event": "phx_reply", "ref": msg.get("ref"), "join_ref": msg.get("join_ref"),
+            "payload": {"status": "ok", "response": response},
+        }))
+
+    def _handle(self, ws):
+        try:
+            for raw in ws:
+                msg = json.loads(raw)
+                if msg.get("event") == "phx_join":
+                    changes = ((msg.get("payload") or {}).get("config") or {}).get("postgres_changes") or []
+                    with self.lock:
+                        self.joins += 1
+                        self.channels[ws] = msg["topic"]
+                    self._reply(ws, msg, {"postgres_changes": [{**c, "id": i} for i, c in enumerate(changes)]})
+                elif msg.get("event") == "heartbeat":
+                    with self.lock:
+                        self.heartbeats += 1
+                    self._reply(ws, msg, {})
+        except ConnectionClosed:
+            pass
+        finally:
+            with self.lock:
+                self.channels.pop(ws, None)
+
+    def joined(self) -> int:
+        with self.lock:
+            return len(self.channels)
+
+    def emit(self, table, kind, record=None, old_record=None, schema="public"):
+        """Send one INSERT / UPDATE / DELETE to every joined channel."""
+        data = {
+            "schema": schema, "table": table, "type": kind,
+            "record": record or {}, "old_record": old_record or {},
+            "commit_timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        with self.lock:
+            channels = list(self.channels.items())
+        for ws, topic in channels:
+            ws.send(json.dumps({"topic": topic, "event": "postgres_changes", "ref": None, "payload": {"data": data, "ids": [0]}}))
+
+    def drop(self):
+        with self.lock:
+            conns = list(self.channels)
+        for ws in conns:
+            ws.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.drop()
+        self.server.shutdown()
@@ -0,0 +1,412 @@
+"""Benchmarks for the data, filter, export and render paths on synthetic tables.
+
+Run from the repository root::
+
+    python -m bench.run --sizes 1000,10000,50000 --render --realtime
+    python -m bench.run --sizes 10000 --compare bench/results/<earlier>.json
+
+Results are written as JSON (``--out``, default ``bench/results/<time>.json``).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+# The MJRV14 change feed must not try the real Supabase host during render runs
+# (nothing listens here, so those runs poll); the realtime case uses RealtimeStub.
+os.environ.setdefault("SUPABASE_REALTIME_URL", "ws://127.0.0.1:9/realtime")
+
+import numpy as np
+import pandas as pd
+
+from bench.datagen import gen_tables
+from bench.fake_redis import FakeRedis
+from bench.fake_supabase import FakeSupabase
+from bench.image_stub import ImageStub
+from bench.realtime_stub import RealtimeStub
+from image_tools import ThumbCache
+from issue_store import IssueSync, SearchIndex, apply_filters, export_xlsx_plain, export_xlsx_with_images
+from progress_store import PROGRESS_TABLE, TASK_TABLE, ProgressSync, group_photos, in_date_range, latest_frame, photo_rows
+from realtime_feed import ChangeFeed
+from singleflight import Revalidator
+from snapshot_store import FileBackend, RedisBackend
+
+DEFAULT_SIZES = "1000,10000,50000"
+QUERIES = [
+    ("", "All", "All"),
+    ("", "Open", "Defect"),
+    ("pipe", "All", "All"),
+    ("ท่อ", "Open", "All"),
+    ("leak 1", "All", "Pending"),
+    ("zzz-no-match", "All", "All"),
+]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def timed(fn, repeat):
+    times, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, {
+        "repeat": repeat,
+        "min_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "max_s": round(max(times), 6),
+    }
+
+
+def cold_start(sync):
+    # What a restarted process does: restore from disk, then one delta sync.
+    assert sync.restore()
+    return sync.refresh()
+
+
+def wait_until(cond, what, timeout=15):
+    t0 = time.perf_counter()
+    while not cond():
+        if time.perf_counter() - t0 > timeout:
+            raise RuntimeError(f"timed out waiting for {what}")
+        time.sleep(0.002)
+    return time.perf_counter() - t0
+
+
+def mb(df):
+    return round(df.memory_usage(deep=True).sum() / 1e6, 2) if not df.empty else 0.0
+
+
+class Suite:
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+
+    def record(self, case, rows, stats, **extra):
+        entry = {"case": case, "rows": rows, **stats, **extra}
+        self.results.append(entry)
+        print(f"  {case:<34} {rows:>8} rows  median {entry['median_s'] * 1000:10.1f} ms"
+              + "".join(f"  {k}={v}" for k, v in extra.items()), flush=True)
+
+    # --- issue_escalation_v2 (ECLV2) ---
+    def issues(self, n, stub):
+        tables = gen_tables(issues=n, seed=self.args.seed, image_base=stub.base_url)
+        client = FakeSupabase(tables)
+        repeat = self.args.repeat
+
+        (df, _, _), stats = timed(lambda: IssueSync(client).refresh(), repeat)
+        self.record("load_data (full)", n, stats, frame_mb=mb(df))
+
+        sync = IssueSync(client)
+        sync.refresh()
+        _, stats = timed(sync.refresh, repeat)
+        self.record("load_data (delta, no changes)", n, stats)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            IssueSync(client, snapshot_backend=FileBackend(tmp)).refresh()
+            _, stats = timed(lambda: cold_start(IssueSync(client, snapshot_backend=FileBackend(tmp))), repeat)
+            self.record("load_data (cold, from snapshot)", n, stats)
+
+        index, stats = timed(lambda: SearchIndex(df), max(1, repeat // 2))
+        self.record("search_index build", n, stats)
+
+        _, stats = timed(lambda: [apply_filters(df, *q, index=index) for q in QUERIES], repeat)
+        self.record("apply_filters (index, 6 queries)", n, stats)
+
+        _, stats = timed(lambda: [apply_filters(df, *q) for q in QUERIES], repeat)
+        self.record("apply_filters (scan, 6 queries)", n, stats)
+
+        if not self.args.skip_export:
+            data, stats = timed(lambda: export_xlsx_plain(df), max(1, repeat // 2))
+            self.record("export_excel_plain", n, stats, xlsx_kb=len(data) // 1024)
+
+        rows = min(n, self.args.image_rows)
+        if rows:
+            sample = df.head(rows)
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = ThumbCache(root=tmp)
+                before = stub.requests
+                (data, failed), stats = timed(lambda: export_xlsx_with_images(sample, cache=cache), 1)
+                self.record("export_excel_with_images (cold)", rows, stats,
+                            http_requests=stub.requests - before, failed=len(failed))
+                before = stub.requests
+                (data, failed), stats = timed(lambda: export_xlsx_with_images(sample, cache=cache), repeat)
+                self.record("export_excel_with_images (warm)", rows, stats,
+                            http_requests=stub.requests - before, failed=len(failed))
+
+    # --- construction_progress / task_master (MJRV14) ---
+    def progress(self, n, stub):
+        tables = gen_tables(progress=n, seed=self.args.seed, image_base=stub.base_url)
+        client = FakeSupabase(tables)
+        repeat = self.args.repeat
+
+        (df_prog, df_task, _, _, latest), stats = timed(lambda: ProgressSync(client).refresh(), repeat)
+        self.record("load_all_data (full)", n, stats, frame_mb=mb(df_prog), tasks=len(df_task))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ProgressSync(client, snapshot_backend=FileBackend(tmp)).refresh()
+            _, stats = timed(lambda: cold_start(ProgressSync(client, snapshot_backend=FileBackend(tmp))), repeat)
+            self.record("load_all_data (cold, from snapshot)", n, stats)
+
+        start_d, end_d = date(2026, 1, 1), df_prog["created_at"].max().date()
+        df_f, stats = timed(lambda: in_date_range(df_prog, start_d, end_d), repeat)
+        self.record("date filter (history)", n, stats)
+
+        _, stats = timed(lambda: latest_frame(latest, start_d, end_d), repeat)
+        self.record("df_latest (snapshot)", n, stats, tasks=len(latest))
+
+        _, stats = timed(lambda: df_f.sort_values("created_at", ascending=False).drop_duplicates("task_name"), repeat)
+        self.record("df_latest (scan fallback)", n, stats)
+
+        all_photos = photo_rows(df_prog)
+        photos = in_date_range(all_photos, start_d, end_d)
+        idx, stats = timed(lambda: group_photos(photos), repeat)
+        self.record("gallery grouping", n, stats, photos=len(photos), groups=len(idx))
+
+    # --- concurrent reruns at cache expiry ---
+    def burst(self, n):
+        """``--burst`` sessions ask for a sync at the same moment (max_age=0 so
+        every call would sync on its own); counts requests and caller latency.
+        ``wait`` and ``stale`` go through the apps' Revalidator, without and
+        with a zero latency budget."""
+        tables = gen_tables(issues=n, seed=self.args.seed)
+        callers = self.args.burst
+
+        for mode in ("direct", "wait", "stale"):
+            client = FakeSupabase(tables, latency=self.args.latency)
+            sync = IssueSync(client)
+            sync.refresh()
+            rv = Revalidator(sync, "issues")
+            client.requests = 0
+            gate, lat = threading.Barrier(callers), []
+
+            def call():
+                gate.wait()
+                t0 = time.perf_counter()
+                if mode == "direct":
+                    sync.refresh()
+                else:
+                    rv.get(0, budget=None if mode == "wait" else 0)
+                lat.append(time.perf_counter() - t0)
+
+            threads = [threading.Thread(target=call) for _ in range(callers)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            while rv.refreshing():
+                time.sleep(0.01)
+            self.record(f"burst x{callers} ({mode})", n, {
+                "repeat": 1, "min_s": round(min(lat), 6),
+                "median_s": round(statistics.median(lat), 6), "max_s": round(max(lat), 6),
+            }, http_requests=client.requests, syncs=rv.flight.runs if mode != "direct" else callers)
+
+    # --- several server processes behind one load balancer ---
+    def replicas(self, n):
+        """``--replicas`` sync objects, one per simulated process, all stale at
+        once; counts database requests without and with a shared snapshot."""
+        tables = gen_tables(issues=n, seed=self.args.seed)
+        count = self.args.replicas
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode, make_backend in (
+                ("independent", lambda: None),
+                ("shared file", lambda: FileBackend(tmp, shared=True)),
+                ("shared redis", lambda b=RedisBackend(FakeRedis()): b),
+            ):
+                client = FakeSupabase(tables, latency=self.args.latency)
+                syncs = [IssueSync(client, snapshot_backend=make_backend()) for _ in range(count)]
+                for sync in syncs:
+                    sync.refresh()
+                client.requests = 0
+                gate, lat = threading.Barrier(count), []
+
+                def call(sync):
+                    gate.wait()
+                    t0 = time.perf_counter()
+                    # Twice: the second call adopts what the elected replica published.
+                    sync.refresh(max_age=0.05)
+                    time.sleep(0.1)
+                    sync.refresh(max_age=1)
+                    lat.append(time.perf_counter() - t0)
+
+                time.sleep(0.06)
+                threads = [threading.Thread(target=call, args=(s,)) for s in syncs]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                self.record(f"replicas x{count} ({mode})", n, {
+                    "repeat": 1, "min_s": round(min(lat), 6),
+                    "median_s": round(statistics.median(lat), 6), "max_s": round(max(lat), 6),
+                }, http_requests=client.requests)
+
+    # --- change feed against a local Realtime stand-in ---
+    def realtime(self, n):
+        """MJRV14's ChangeFeed on RealtimeStub: join, INSERT/UPDATE/DELETE events
+        applied to ProgressSync (event -> applied latency), and a dropped
+        connection whose reconnect triggers one resync that picks up a row
+        inserted while the feed was down."""
+        tables = gen_tables(progress=n, seed=self.args.seed)
+        client = FakeSupabase(tables)
+        sync = ProgressSync(client)
+        sync.refresh()
+        rows = lambda: set(sync.df_prog["id"])
+        status = lambda rid: float(sync.df_prog.loc[sync.df_prog["id"] == rid, "status"].iloc[0])
+
+        with RealtimeStub() as rt:
+            t0 = time.perf_counter()
+            feed = ChangeFeed(
+                rt.url, "bench", [PROGRESS_TABLE, TASK_TABLE],
+                on_change=sync.apply_change, on_status=sync.set_live, topic="realtime:bench"
+            ).start()
+            try:
+                wait_until(lambda: sync.live, "join")
+                joined = time.perf_counter() - t0
+                sync.refresh(max_age=60)
+                before = client.requests
+
+                record = dict(client.db[PROGRESS_TABLE][-1], id=10 ** 9, status=1.5)
+                lat = []
+                rt.emit(PROGRESS_TABLE, "INSERT", record)
+                lat.append(wait_until(lambda: record["id"] in rows(), "INSERT"))
+                rt.emit(PROGRESS_TABLE, "UPDATE", dict(record, status=2.5), {"id": record["id"]})
+                lat.append(wait_until(lambda: status(record["id"]) == 2.5, "UPDATE"))
+                rt.emit(PROGRESS_TABLE, "DELETE", None, {"id": record["id"]})
+                lat.append(wait_until(lambda: record["id"] not in rows(), "DELETE"))
+                sync.refresh(max_age=60)
+                polled = client.requests - before
+                self.record("realtime events (3)", n, {
+                    "repeat": 1, "min_s": round(min(lat), 6),
+                    "median_s": round(statistics.median(lat), 6), "max_s": round(max(lat), 6),
+                }, join_ms=round(joined * 1000, 1), polls_while_live=polled)
+
+                missed = dict(record, id=10 ** 9 + 1)
+                rt.drop()
+                wait_until(lambda: not sync.live, "disconnect")
+                client.db[PROGRESS_TABLE].append(missed)
+                t0 = time.perf_counter()
+                wait_until(lambda: sync.live, "reconnect")
+                sync.refresh(max_age=60)
+                if missed["id"] not in rows():
+                    raise RuntimeError("row inserted while the feed was down was not resynced")
+                self.record("realtime reconnect + resync", n, {
+                    "repeat": 1, **dict.fromkeys(("min_s", "median_s", "max_s"), round(time.perf_counter() - t0, 6)),
+                }, joins=rt.joins)
+            finally:
+                feed.stop()
+
+    # --- full script runs (Streamlit AppTest) ---
+    def render(self, n, stub):
+        import streamlit as st
+        from streamlit.testing.v1 import AppTest
+
+        import db_client
+
+        rows = min(n, self.args.render_rows)
+        tables = gen_tables(issues=rows, progress=rows, seed=self.args.seed, image_base=stub.base_url)
+        client = FakeSupabase(tables)
+        db_client.create_client = lambda *a, **k: client
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+        for script, page in (("ECLV2.py", None), ("MJRV14.py", "dashboard")):
+            st.cache_resource.clear()
+            st.cache_data.clear()
+
+            def run():
+                at = AppTest.from_file(os.path.join(root, script), default_timeout=600)
+                if page:
+                    at.query_params["page"] = page
+                at.run()
+                if at.exception:
+                    raise RuntimeError(f"{script}: {at.exception[0].value}")
+                return at
+
+            _, cold = timed(run, 1)
+            self.record(f"render {script} (cold)", rows, cold)
+            _, warm = timed(run, self.args.repeat)
+            self.record(f"render {script} (warm)", rows, warm)
+
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    with open(path, encoding="utf-8") as f:
+        before = {(r["case"], r["rows"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {path}")
+    for r in results:
+        old = before.get((r["case"], r["rows"]))
+        if old and old["median_s"]:
+            ratio = r["median_s"] / old["median_s"]
+            print(f"  {r['case']:<34} {r['rows']:>8}  {old['median_s'] * 1000:10.1f} -> {r['median_s'] * 1000:10.1f} ms  x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma separated row counts (1k-200k)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--image-rows", type=int, default=300, help="rows in the export-with-images case (0 skips)")
+    parser.add_argument("--image-delay", type=float, default=0.0, help="seconds the image stub waits per request")
+    parser.add_argument("--skip-export", action="store_true", help="skip the plain Excel export")
+    parser.add_argument("--burst", type=int, default=40, help="concurrent sessions in the burst case (0 skips)")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the fake database waits per request in the burst case")
+    parser.add_argument("--replicas", type=int, default=4, help="simulated server processes in the replicas case (0 skips)")
+    parser.add_argument("--realtime", action="store_true", help="also run the change feed against a local Realtime stand-in")
+    parser.add_argument("--render", action="store_true", help="also time full ECLV2 / MJRV14 script runs")
+    parser.add_argument("--render-rows", type=int, default=20000, help="row cap for render runs")
+    parser.add_argument("--out", help="JSON results path")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    suite = Suite(args)
+    with ImageStub(delay=args.image_delay) as stub:
+        for n in sizes:
+            print(f"\n== {n} rows")
+            suite.issues(n, stub)
+            suite.progress(n, stub)
+            if args.burst:
+                suite.burst(n)
+            if args.replicas:
+                suite.replicas(n)
+            if args.realtime:
+                suite.realtime(n)
+            if args.render:
+                suite.render(n, stub)
+
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    payload = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": git_rev(),
+            "python": sys.version.split()[0],
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": suite.results,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    print(f"\nwrote {out}")
+
+    if args.compare:
+        compare(suite.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
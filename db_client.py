@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+
+import httpx
+import streamlit as st
+from supabase import Client, ClientOptions, create_client
+
+from tracing import span
+
+# =========================
+# Shared Supabase client (one per process)
+# =========================
+# Every table, rpc and storage call of every session goes through one pooled
+# HTTP client, so connections (and their TLS sessions) are kept alive and reused.
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120)
+# Writes get longer than reads so photo uploads on site connections still fit.
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0, write=60.0)
+LATENCY_WINDOW = 500
+
+
+class RequestStats:
+    """Request counts and latencies per endpoint (e.g. ``GET rest/issue_escalation_v2``)."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.started = time.time()
+
+    def record(self, key, seconds, ok):
+        with self.lock:
+            e = self.endpoints.get(key)
+            if e is None:
+                e = self.endpoints[key] = {"count": 0, "errors": 0, "total": 0.0, "recent": deque(maxlen=self.window)}
+            e["count"] += 1
+            e["errors"] += 0 if ok else 1
+            e["total"] += seconds
+            e["recent"].append(seconds)
+
+    def snapshot(self) -> list:
+        """One dict per endpoint with count, errors and avg/p50/p95/max in ms."""
+        with self.lock:
+            items = [(k, dict(e, recent=sorted(e["recent"]))) for k, e in self.endpoints.items()]
+        rows = []
+        for key, e in sorted(items, key=lambda kv: -kv[1]["count"]):
+            recent = e["recent"]
+            rows.append({
+                "endpoint": key,
+                "count": e["count"],
+                "errors": e["errors"],
+                "avg_ms": round(1000 * e["total"] / e["count"], 1),
+                "p50_ms": round(1000 * recent[len(recent) // 2], 1),
+                "p95_ms": round(1000 * recent[min(len(recent) - 1, int(len(recent) * 0.95))], 1),
+                "max_ms": round(1000 * recent[-1], 1),
+            })
+        return rows
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.started = time.time()
+
+
+def _content_rows(response):
+    # PostgREST reports the returned slice as Content-Range: 0-999/* (or */n for head).
+    rng = response.headers.get("content-range", "").split("/")[0]
+    if "-" not in rng:
+        return None
+    lo, hi = rng.split("-", 1)
+    return int(hi) - int(lo) + 1 if lo.isdigit() and hi.isdigit() else None
+
+
+def _endpoint(request) -> str:
+    # /rest/v1/<table>, /rest/v1/rpc/<fn>, /storage/v1/object/<bucket>/... -> short key
+    parts = [p for p in request.url.path.split("/") if p]
+    if len(parts) >= 3 and parts[0] == "rest":
+        name = "/".join(parts[2:4]) if parts[2] == "rpc" else parts[2]
+        return f"{request.method} rest/{name}"
+    if len(parts) >= 4 and parts[0] == "storage":
+        return f"{request.method} storage/{parts[2]}/{parts[3]}"
+    return f"{request.method} {'/'.join(parts[:2])}"
+
+
+class _MeteredClient(httpx.Client):
+    # send() returns after the body is read, so this is the full round trip.
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def send(self, request, **kwargs):
+        key = _endpoint(request)
+        t0 = time.perf_counter()
+        ok = False
+        with span(key, "http") as sp:
+            try:
+                response = super().send(request, **kwargs)
+                ok = response.status_code < 400
+                sp["status"] = response.status_code
+                if not kwargs.get("stream"):
+                    sp["bytes"] = len(response.content)
+                    sp["rows"] = _content_rows(response)
+                return response
+            finally:
+                self.stats.record(key, time.perf_counter() - t0, ok)
+
+
+@st.cache_resource
+def get_request_stats() -> RequestStats:
+    return RequestStats()
+
+
+@st.cache_resource
+def get_client(url: str, key: str) -> Client:
+    """The process-wide Supabase client for ``url``/``key``, shared by all sessions."""
+    http = _MeteredClient(
+        get_request_stats(),
+        limits=HTTP_LIMITS,
+        timeout=HTTP_TIMEOUT,
+        http2=True,
+        follow_redirects=True,
+    )
+    options = ClientOptions(
+        httpx_client=http,
+        # Sessions share this client, so it must not pick up a user's auth state.
+        auto_refresh_token=False,
+        persist_session=False,
+    )
+    return create_client(url, key, options=options)
+
+
+def render_request_stats():
+    """Admin expander with the shared client's request counts and latencies."""
+    stats = get_request_stats()
+    with st.expander("📡 Supabase requests"):
+        rows = stats.snapshot()
+        st.caption(f"Since {time.strftime('%d/%m %H:%M', time.localtime(stats.started))} (all sessions)")
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("No requests yet.")
+        if st.button("Reset counters", key="reset_request_stats"):
+            stats.reset()
+            st.rerun()
@@ -0,0 +1,247 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from PIL import Image, ImageOps
+from requests.adapters import HTTPAdapter
+
+# =========================
+# Image helpers: upload variants, export downloads + thumbnail cache
+# =========================
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_TIMEOUT = 4
+EXPORT_DEADLINE = 60
+
+# Thumbnails are stored at the size they are embedded at (one 80pt Excel row).
+THUMB_BOX = (140, 96)
+THUMB_QUALITY = 80
+THUMB_CACHE_DIR = os.environ.get("THUMB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mep_thumb_cache"))
+THUMB_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# Storage objects are uuid-named and never rewritten, so a recent entry is served
+# without even a conditional request.
+THUMB_FRESH_SECONDS = 24 * 3600
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    # One pooled session per process: keep-alive connections to the storage host
+    # are reused across rows and across exports.
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DOWNLOAD_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def make_thumbnail(data: bytes, box=THUMB_BOX) -> bytes:
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    img = img.convert("RGB")
+    img.thumbnail(box)
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=THUMB_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+class ThumbCache:
+    """Size-bounded on-disk LRU of export thumbnails, keyed by image URL.
+
+    Each entry is ``<key>.jpg`` plus ``<key>.json`` holding the ETag and
+    Last-Modified of the original, used to revalidate with a conditional GET.
+    File mtime doubles as the LRU clock.
+    """
+
+    def __init__(self, root=THUMB_CACHE_DIR, max_bytes=THUMB_CACHE_MAX_BYTES, fresh_seconds=THUMB_FRESH_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.total = sum(e.stat().st_size for e in os.scandir(root) if e.name.endswith(".jpg"))
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key + ".jpg"), os.path.join(self.root, key + ".json")
+
+    def get(self, url, timeout=DOWNLOAD_TIMEOUT) -> bytes:
+        img_path, meta_path = self._paths(url)
+        meta, thumb = None, None
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(img_path, "rb") as f:
+                thumb = f.read()
+        except (OSError, ValueError):
+            meta, thumb = None, None
+
+        if thumb is not None and time.time() - meta.get("checked", 0) < self.fresh_seconds:
+            self._touch(img_path)
+            return thumb
+
+        headers = {}
+        if thumb is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = get_session().get(url, timeout=timeout, headers=headers)
+        if resp.status_code == 304 and thumb is not None:
+            meta["checked"] = time.time()
+            self._write(meta_path, json.dumps(meta).encode("utf-8"))
+            self._touch(img_path)
+            return thumb
+
+        resp.raise_for_status()
+        thumb = make_thumbnail(resp.content)
+        self.put(url, thumb, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return thumb
+
+    def put(self, url, thumb, etag=None, last_modified=None):
+        img_path, meta_path = self._paths(url)
+        old_size = os.path.getsize(img_path) if os.path.exists(img_path) else 0
+        self._write(img_path, thumb)
+        meta = {"url": url, "etag": etag, "last_modified": last_modified, "checked": time.time()}
+        self._write(meta_path, json.dumps(meta).encode("utf-8"))
+        with self.lock:
+            self.total += len(thumb) - old_size
+            if self.total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (e for e in os.scandir(self.root) if e.name.endswith(".jpg")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        target = self.max_bytes * 0.9
+        for e in entries:
+            if self.total <= target:
+                break
+            size = e.stat().st_size
+            for path in (e.path, e.path[:-4] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.total -= size
+
+    def _write(self, path, data):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+_thumb_cache = None
+
+
+def get_thumb_cache() -> ThumbCache:
+    global _thumb_cache
+    with _session_lock:
+        if _thumb_cache is None:
+            _thumb_cache = ThumbCache()
+        return _thumb_cache
+
+
+def download_images(urls, max_workers=DOWNLOAD_WORKERS, timeout=DOWNLOAD_TIMEOUT, deadline=EXPORT_DEADLINE, cache=None):
+    """Fetch thumbnails for ``urls`` concurrently and return ``(images, failures)``.
+
+    Both dicts are keyed by position in ``urls``; ``images`` holds JPEG
+    thumbnail bytes (served from the on-disk cache when possible) and
+    ``failures`` a short reason. Rows without an http URL are skipped silently,
+    anything still pending when ``deadline`` seconds pass is reported as such.
+    """
+    cache = cache or get_thumb_cache()
+    images, failures = {}, {}
+    jobs = {i: str(u) for i, u in enumerate(urls) if u and str(u).startswith("http")}
+    if not jobs:
+        return images, failures
+
+    stop_at = time.monotonic() + deadline
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {pool.submit(cache.get, variant_url(url, "th"), timeout): i for i, url in jobs.items()}
+
+    try:
+        while pending:
+            remaining = stop_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i = pending.pop(fut)
+                try:
+                    images[i] = fut.result()
+                except Exception as e:
+                    failures[i] = f"download failed: {e}"
+    finally:
+        for fut, i in pending.items():
+            fut.cancel()
+            failures[i] = f"skipped: export deadline of {deadline}s reached"
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return images, failures
+
+
+# =========================
+# Upload-time variants
+# =========================
+# Longest edge in px per variant; "th" fits the 150px cards, "md" the galleries.
+UPLOAD_VARIANTS = {"th": 320, "md": 800, "full": 2048}
+UPLOAD_QUALITY = {"th": 75, "md": 80, "full": 85}
+# Keys are uuid-based and never overwritten, so browsers may cache them for good.
+UPLOAD_FILE_OPTIONS = {"content-type": "image/jpeg", "cache-control": "31536000"}
+
+
+def make_upload_variants(data: bytes) -> dict:
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+    out = {}
+    for name, edge in UPLOAD_VARIANTS.items():
+        variant = img.copy()
+        variant.thumbnail((edge, edge))
+        buf = io.BytesIO()
+        variant.save(buf, format="JPEG", quality=UPLOAD_QUALITY[name], optimize=True, progressive=True)
+        out[name] = buf.getvalue()
+    return out
+
+
+def variant_url(url, size):
+    # Only photos stored by upload_image have variants; anything else is served as is.
+    if size == "full" or not url or not str(url).endswith("_full.jpg"):
+        return url
+    return str(url)[:-len("_full.jpg")] + f"_{size}.jpg"
+
+
+def upload_image(client, bucket, data: bytes, stem: str, ext: str = "jpg") -> str:
+    """Store a photo as capped ``<stem>_{th,md,full}.jpg`` and return the full URL.
+
+    EXIF orientation is applied before re-encoding. Files Pillow cannot read
+    are stored unchanged as ``<stem>.<ext>``.
+    """
+    storage = client.storage.from_(bucket)
+    try:
+        variants = make_upload_variants(data)
+    except Exception:
+        key = f"{stem}.{ext}"
+        storage.upload(key, data)
+        return storage.get_public_url(key)
+
+    # Smaller variants first: once the full key exists, every variant does.
+    for name in ("th", "md", "full"):
+        storage.upload(f"{stem}_{name}.jpg", variants[name], UPLOAD_FILE_OPTIONS)
+    return storage.get_public_url(f"{stem}_full.jpg")
@@ -0,0 +1,870 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from image_tools import download_images
+from progress_store import PAGE_SIZE, fetch_table
+from schema import ISSUE_SCHEMA, apply_schema, select_cols
+from snapshot_store import Snapshot, schema_tag
+from tracing import traced
+
+# =========================
+# Data layer for issue_escalation_v2 (ECLV2)
+# =========================
+TABLE_NAME = "issue_escalation_v2"
+LOCAL_TZ = "Asia/Bangkok"
+ISSUE_COLS = select_cols(ISSUE_SCHEMA)
+# Reruns within this many seconds of the last sync reuse the in-memory frame.
+SYNC_MAX_AGE = 30
+# Each delta re-reads this many seconds behind the high-water mark, for rows
+# whose transaction stamped changed_at before the mark but committed after it.
+SYNC_OVERLAP = 60
+# High-water mark after a full load that found no changed_at (an empty table):
+# later syncs are deltas from here instead of repeating the full load.
+HWM_EPOCH = pd.Timestamp(0, tz="UTC").tz_convert(LOCAL_TZ)
+
+
+@traced("normalize_issues", "transform")
+def normalize_issues(df_raw: pd.DataFrame) -> pd.DataFrame:
+    if df_raw.empty:
+        return pd.DataFrame()
+
+    if "created_at" in df_raw.columns:
+        df_raw["created_at"] = pd.to_datetime(
+            df_raw["created_at"], utc=True, errors="coerce"
+        ).dt.tz_convert(LOCAL_TZ)
+    else:
+        df_raw["created_at"] = pd.Timestamp.now(tz=LOCAL_TZ)
+
+    if "updated_at" in df_raw.columns:
+        df_raw["updated_at"] = pd.to_datetime(
+            df_raw["updated_at"], utc=True, errors="coerce"
+        ).dt.tz_convert(LOCAL_TZ)
+    else:
+        df_raw["updated_at"] = df_raw["created_at"]
+
+    if "changed_at" in df_raw.columns:
+        df_raw["changed_at"] = pd.to_datetime(
+            df_raw["changed_at"], utc=True, errors="coerce"
+        ).dt.tz_convert(LOCAL_TZ)
+    else:
+        df_raw["changed_at"] = df_raw["updated_at"]
+
+    if "likes" not in df_raw.columns:
+        df_raw["likes"] = 0
+
+    if "category" not in df_raw.columns:
+        df_raw["category"] = ""
+
+    if "related_to" not in df_raw.columns:
+        df_raw["related_to"] = ""
+
+    if "display_no" not in df_raw.columns:
+        df_raw["display_no"] = df_raw["id"].apply(lambda x: f"{x:03d}")
+
+    if "category_seq" not in df_raw.columns:
+        df_raw["category_seq"] = None
+
+    return apply_schema(df_raw, ISSUE_SCHEMA)
+
+
+class IssueSync:
+    """Keeps the last issue frame and pulls only rows changed since the high-water mark.
+
+    ``changed_at`` is stamped by the database on every insert and update (see
+    sql/issue_sync.sql), so rows written by any client are picked up; it is
+    kept apart from ``updated_at``, which likes leave alone. Deletes are detected by comparing the server row count with the
+    local one and, only when they disagree, reconciling the id set.
+
+    The app's own writes are applied write-through with ``apply_upsert`` /
+    ``apply_delete`` / ``patch_row``: the frame is patched in place of a reload
+    and ``version`` is bumped, so only caches keyed on the version go stale.
+    ``search_version`` moves only when rows are added or removed or an indexed
+    column changes, so a like does not rebuild the search index.
+
+    ``peek`` returns the current ``(df, version, search_version)`` without
+    taking the lock, so readers are never held up by a sync running on
+    another thread.
+
+    With a ``snapshot_backend`` (see snapshot_store) the frame and high-water
+    mark are saved after syncs, and ``restore`` starts a new process from them:
+    the next refresh is then a delta rather than a full load. With a shared
+    backend a stale refresh first adopts what another replica published, and
+    only the replica holding the refresh lease queries the table.
+    """
+
+    def __init__(self, client, table: str = TABLE_NAME, snapshot_backend=None):
+        self.client = client
+        self.table = table
+        self.snapshot = Snapshot(table, schema_tag(ISSUE_SCHEMA), snapshot_backend) if snapshot_backend else None
+        self.df = pd.DataFrame()
+        self.hwm = None
+        # Bumped on every change to df; caches derived from the frame key on it.
+        self.version = 0
+        self.search_version = 0
+        self.synced_at = 0.0
+        # Set by restore: the next refresh syncs whatever the snapshot's age.
+        self.resync = False
+        # (df, version, search_version) swapped in as one object, for lock-free readers.
+        self.published = None
+        # Wall time of the last write-through; older shared snapshots lack it.
+        self.patched_at = 0.0
+        self.lock = threading.Lock()
+
+    def needs_sync(self, max_age: float = 0) -> bool:
+        return self.hwm is None or self.resync or time.monotonic() - self.synced_at >= max_age
+
+    def peek(self):
+        """The current ``(df, version, search_version)``, or None before the first load."""
+        return self.published if self.hwm is not None else None
+
+    def refresh(self, max_age: float = 0):
+        """Sync with the table and return ``(df, version, search_version)``.
+
+        With ``max_age`` the sync is skipped if the last one is that recent.
+        """
+        with self.lock:
+            if not self.needs_sync(max_age):
+                return self.published
+            shared = self.snapshot is not None and self.snapshot.shared
+            if shared and self.hwm is not None:
+                self._adopt(self.snapshot.newer(self.patched_at))
+                if not self.needs_sync(max_age):
+                    return self.published
+                if not self.snapshot.acquire():
+                    # Another replica is refreshing; its result is adopted on a later call.
+                    return self.published
+            try:
+                started = time.time()
+                self.resync = False
+                if self.hwm is None:
+                    self._full_load()
+                else:
+                    self._apply_delta()
+                    self._reconcile_deletes()
+                self.synced_at = time.monotonic()
+                if self.snapshot is not None and self.hwm is not None:
+                    self.snapshot.maybe_save(self.version, lambda: (
+                        {"issues": self.df}, {"watermark": self.hwm.isoformat(), "sync_started": started}
+                    ))
+            finally:
+                if shared:
+                    self.snapshot.release()
+            return self.published
+
+    def restore(self) -> bool:
+        """Start from the stored snapshot, if there is one.
+
+        A private snapshot counts as stale; a shared one is as fresh as its
+        last sync by any replica.
+        """
+        if self.snapshot is None:
+            return False
+        with self.lock:
+            if self.hwm is not None:
+                return False
+            return self._adopt(self.snapshot.load(), resync=not self.snapshot.shared)
+
+    def _adopt(self, loaded, resync=False) -> bool:
+        if loaded is None:
+            return False
+        frames, meta = loaded
+        if frames is not None:
+            self._set_df(apply_schema(frames["issues"], ISSUE_SCHEMA))
+            self.hwm = pd.Timestamp(meta["watermark"]).tz_convert(LOCAL_TZ)
+            self.snapshot.saved_version = self.version
+        if resync:
+            self.resync = True
+        self.synced_at = self.snapshot.synced_at(meta)
+        return True
+
+    def _set_df(self, df, reindex=True):
+        self.df = df
+        self.version += 1
+        if reindex:
+            self.search_version += 1
+        self.published = (df, self.version, self.search_version)
+
+    def patch_row(self, record_id, values: dict):
+        with self.lock:
+            self.patched_at = time.time()
+            if self.df.empty:
+                return
+            # Copy-on-write: a frame already handed out by refresh() is never mutated.
+            df = self.df.copy()
+            mask = df["id"] == record_id
+            for col, val in values.items():
+                if isinstance(df[col].dtype, pd.CategoricalDtype) and val not in df[col].cat.categories:
+                    df[col] = df[col].cat.add_categories([val])
+                df.loc[mask, col] = val
+            self._set_df(df, reindex=not INDEX_COLS.isdisjoint(values))
+
+    def apply_upsert(self, rows):
+        """Merge rows returned by an insert/update into the frame by id."""
+        if not rows:
+            return
+        delta = normalize_issues(pd.DataFrame(rows))
+        with self.lock:
+            self.patched_at = time.time()
+            # The high-water mark is left alone: the next delta re-reads these
+            # rows, which the id merge makes harmless.
+            self._merge(delta)
+
+    def apply_delete(self, record_id):
+        with self.lock:
+            self.patched_at = time.time()
+            if self.df.empty:
+                return
+            self._set_df(self.df[self.df["id"] != record_id].reset_index(drop=True))
+
+    def reset(self):
+        with self.lock:
+            self._set_df(pd.DataFrame())
+            self.hwm = None
+
+    def _full_load(self):
+        # Keyset pages: a single select would stop at the server's max-rows.
+        df, _ = fetch_table(self.client, self.table, ISSUE_COLS)
+        df = normalize_issues(df)
+        self._set_df(df.sort_values("id", ascending=False, ignore_index=True) if not df.empty else df)
+        self._bump_hwm(self.df)
+        if self.hwm is None:
+            self.hwm = HWM_EPOCH
+
+    def _apply_delta(self):
+        # The window starts SYNC_OVERLAP before the mark, so late commits are not
+        # skipped; rows re-read unchanged are dropped below.
+        since = (self.hwm - pd.Timedelta(seconds=SYNC_OVERLAP)).tz_convert("UTC").isoformat()
+        rows = []
+        while True:
+            # Paged like the full load; a long gap (e.g. after a restore) can exceed max-rows.
+            res = (
+                self.client.table(self.table)
+                .select(ISSUE_COLS)
+                .gte("changed_at", since)
+                .order("changed_at")
+                .order("id")
+                .range(len(rows), len(rows) + PAGE_SIZE - 1)
+                .execute()
+            )
+            rows.extend(res.data)
+            if len(res.data) < PAGE_SIZE:
+                break
+        delta = normalize_issues(pd.DataFrame(rows))
+        if delta.empty:
+            return
+        self._bump_hwm(delta)
+        if not self.df.empty:
+            # Rows already held at the same changed_at (the overlap window,
+            # write-through rows) are no change; the version stays put.
+            held = delta["id"].map(self.df.set_index("id")["changed_at"])
+            delta = delta[~(held == delta["changed_at"]).to_numpy()]
+        if not delta.empty:
+            self._merge(delta)
+
+    def _merge(self, delta):
+        if self.df.empty:
+            merged = delta
+        else:
+            kept = self.df[~self.df["id"].isin(delta["id"])]
+            # Categories of the two frames differ, so the concat is re-typed.
+            merged = apply_schema(pd.concat([delta, kept], ignore_index=True), ISSUE_SCHEMA)
+
+        self._set_df(merged.sort_values("id", ascending=False, ignore_index=True), reindex=self._moves_index(delta))
+
+    def _moves_index(self, delta) -> bool:
+        # Same ids (so same positions, the frame is sorted by id) and the same
+        # indexed values: the current search index still fits the merged frame.
+        if self.df.empty or not delta["id"].isin(self.df["id"]).all():
+            return True
+        cols = [c for c in INDEX_COLS if c in delta.columns]
+        held = self.df.set_index("id").loc[delta["id"], cols].astype(str)
+        return not held.equals(delta.set_index("id")[cols].astype(str))
+
+    def _reconcile_deletes(self):
+        if self.df.empty:
+            return
+
+        res = self.client.table(self.table).select("id", count="exact", head=True).execute()
+        if res.count is None or res.count >= len(self.df):
+            return
+
+        live, _ = fetch_table(self.client, self.table, "id")
+        live_ids = live["id"] if not live.empty else []
+        self._set_df(self.df[self.df["id"].isin(live_ids)].reset_index(drop=True))
+
+    def _bump_hwm(self, frame: pd.DataFrame):
+        if frame.empty or "changed_at" not in frame.columns:
+            return
+        latest = frame["changed_at"].max()
+        if pd.isna(latest):
+            return
+        if self.hwm is None or latest > self.hwm:
+            self.hwm = latest
+
+
+# =========================
+# Likes: atomic increments with write coalescing
+# =========================
+LIKES_RPC = "increment_issue_likes_v2"
+LIKE_FLUSH_SECONDS = 2.0
+# Failed flushes are retried after 2, 4, 8 ... flush intervals, up to this many seconds.
+LIKE_RETRY_MAX_SECONDS = 60
+
+
+class LikeBuffer:
+    """Groups like clicks per record and flushes them as one atomic increment.
+
+    Clicks land in ``pending``; a daemon thread moves them to ``inflight`` and
+    calls the ``likes = likes + n`` RPC (see sql/increment_likes.sql). The
+    total it returns is kept in ``confirmed`` so pages can show an up-to-date
+    count without reloading the table. Clicks of a failed flush are retried
+    with backoff; ``error`` holds the last failure until a flush succeeds.
+    """
+
+    def __init__(self, client, rpc_name=LIKES_RPC, flush_seconds=LIKE_FLUSH_SECONDS, on_flushed=None):
+        self.client = client
+        self.rpc_name = rpc_name
+        self.flush_seconds = flush_seconds
+        self.on_flushed = on_flushed
+        self.pending = {}
+        self.inflight = {}
+        self.confirmed = {}
+        self.error = None
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        threading.Thread(target=self._run, daemon=True, name="like-flush").start()
+
+    def add(self, record_id, n=1):
+        with self.lock:
+            self.pending[record_id] = self.pending.get(record_id, 0) + n
+        self.wake.set()
+
+    def display(self, record_id, base) -> int:
+        with self.lock:
+            shown = max(int(base or 0), self.confirmed.get(record_id, 0))
+            return shown + self.pending.get(record_id, 0) + self.inflight.get(record_id, 0)
+
+    def flush(self) -> bool:
+        """Send the pending clicks; False if any increment failed."""
+        failed = None
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            for rid, n in batch.items():
+                self.inflight[rid] = self.inflight.get(rid, 0) + n
+
+        for rid, n in batch.items():
+            try:
+                res = self.client.rpc(self.rpc_name, {"record_id": rid, "n": n}).execute()
+                total = int(res.data) if res.data is not None else None
+            except Exception as e:
+                # Put the clicks back; the next flush retries them.
+                with self.lock:
+                    self.inflight[rid] -= n
+                    if not self.inflight[rid]:
+                        del self.inflight[rid]
+                    self.pending[rid] = self.pending.get(rid, 0) + n
+                failed = e
+                continue
+
+            with self.lock:
+                self.inflight[rid] -= n
+                if not self.inflight[rid]:
+                    del self.inflight[rid]
+                if total is not None:
+                    self.confirmed[rid] = total
+            if total is not None and self.on_flushed:
+                self.on_flushed(rid, total)
+
+        if failed is not None:
+            self.error = f"{type(failed).__name__}: {failed}"
+            return False
+        if batch:
+            self.error = None
+        return True
+
+    def _run(self):
+        while True:
+            self.wake.wait()
+            # Let a burst of clicks accumulate before the round trip.
+            time.sleep(self.flush_seconds)
+            self.wake.clear()
+            if self.flush():
+                self.failures = 0
+                continue
+            # The clicks are back in pending; retry them without waiting for a new click.
+            self.failures += 1
+            time.sleep(min(LIKE_RETRY_MAX_SECONDS, self.flush_seconds * 2 ** self.failures))
+            self.wake.set()
+
+
+# =========================
+# Category running numbers
+# =========================
+SEQ_RPC = "reserve_category_seq"
+
+
+class SequenceAllocator:
+    """Hands out category_seq numbers reserved atomically by the database.
+
+    With ``block_size`` > 1 each RPC leases that many numbers for this process,
+    so most submits need no round trip; unused numbers of a lease are lost on
+    restart, leaving gaps but never duplicates.
+    """
+
+    def __init__(self, client, rpc_name=SEQ_RPC, block_size=1):
+        self.client = client
+        self.rpc_name = rpc_name
+        self.block_size = max(1, int(block_size))
+        self.blocks = {}
+        self.lock = threading.Lock()
+
+    def next(self, category) -> int:
+        with self.lock:
+            nxt, end = self.blocks.get(category, (0, 0))
+            if nxt >= end:
+                res = self.client.rpc(
+                    self.rpc_name, {"p_category": category, "p_count": self.block_size}
+                ).execute()
+                if res.data is None:
+                    raise RuntimeError(f"{self.rpc_name} returned no number for {category}")
+                nxt, end = int(res.data), int(res.data) + self.block_size
+            self.blocks[category] = (nxt + 1, end)
+            return nxt
+
+
+def format_display_no(category, seq) -> str:
+    prefix = "P" if category == "Pending" else "D"
+    return f"{prefix}-{seq:03d}"
+
+
+# =========================
+# Keyword search index
+# =========================
+SEARCH_COLS = ["staff_name", "issue_detail", "related_to", "category", "display_no"]
+# Columns a SearchIndex depends on; changes to other columns keep it valid.
+INDEX_COLS = frozenset(SEARCH_COLS + ["status"])
+_SEP = "\x1f"
+
+
+def _gram_keys(codes: np.ndarray) -> np.ndarray:
+    # Pack three code points (< 2**21 each) into one int64 trigram key.
+    c = codes.astype(np.int64)
+    return (c[:-2] << 42) | (c[1:-1] << 21) | c[2:]
+
+
+class SearchIndex:
+    """Character-trigram inverted index over the searchable issue columns.
+
+    Trigrams need no word boundaries, so Thai text without spaces is matched
+    the same way as English. Postings are row positions of the frame the index
+    was built from, so it must only be used with frames of the same rows and
+    indexed values (key it on ``IssueSync.search_version``). Status and category are kept as position lists too.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+        if df.empty:
+            self.haystack = np.array([], dtype=object)
+            self.gram_keys = np.array([], dtype=np.int64)
+            self.gram_starts = np.array([0], dtype=np.int64)
+            self.gram_docs = np.array([], dtype=np.int32)
+            self.by_status, self.by_category = {}, {}
+            return
+
+        cols = [df[col].astype(str).str.lower().fillna("") for col in SEARCH_COLS]
+        hay = cols[0]
+        for col in cols[1:]:
+            hay = hay + _SEP + col
+        self.haystack = hay.to_numpy(dtype=object)
+
+        # All rows as one code-point array; each row is followed by a separator
+        # and any trigram touching a separator is dropped.
+        codes = np.frombuffer((_SEP.join(self.haystack) + _SEP).encode("utf-32-le"), dtype=np.uint32)
+        lengths = np.fromiter((len(h) + 1 for h in self.haystack), dtype=np.int64, count=self.n)
+        docs = np.repeat(np.arange(self.n, dtype=np.int32), lengths)[:-2]
+        keys = _gram_keys(codes)
+        sep = ord(_SEP)
+        valid = (codes[:-2] != sep) & (codes[1:-1] != sep) & (codes[2:] != sep)
+        keys, docs = keys[valid], docs[valid]
+
+        # Stable sort keeps positions ascending inside each posting list.
+        order = np.argsort(keys, kind="stable")
+        keys, docs = keys[order], docs[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (docs[1:] != docs[:-1])
+        keys, docs = keys[keep], docs[keep]
+
+        self.gram_keys, starts = np.unique(keys, return_index=True)
+        self.gram_starts = np.append(starts, len(keys))
+        self.gram_docs = docs
+
+        self.by_status = {k: v for k, v in df.groupby("status", sort=False).indices.items()}
+        self.by_category = {k: v for k, v in df.groupby("category", sort=False).indices.items()}
+
+    def _postings(self, key):
+        i = np.searchsorted(self.gram_keys, key)
+        if i >= len(self.gram_keys) or self.gram_keys[i] != key:
+            return np.array([], dtype=np.int32)
+        return self.gram_docs[self.gram_starts[i]:self.gram_starts[i + 1]]
+
+    def search(self, kw: str) -> np.ndarray:
+        kw = kw.lower().strip()
+        if not kw:
+            return np.arange(self.n)
+
+        if len(kw) < 3:
+            return np.flatnonzero([kw in h for h in self.haystack])
+
+        qkeys = np.unique(_gram_keys(np.frombuffer(kw.encode("utf-32-le"), dtype=np.uint32)))
+        lists = sorted((self._postings(k) for k in qkeys), key=len)
+        cand = lists[0]
+        for lst in lists[1:]:
+            if not len(cand):
+                break
+            cand = np.intersect1d(cand, lst, assume_unique=True)
+
+        # Trigrams only narrow the candidates; confirm the actual substring.
+        return cand[[kw in self.haystack[p] for p in cand]].astype(np.int64)
+
+    def query(self, search_text, status_filter="All", category_filter="All") -> np.ndarray:
+        pos = self.search(search_text or "")
+        if status_filter != "All":
+            pos = np.intersect1d(pos, self.by_status.get(status_filter, []), assume_unique=True)
+        if category_filter != "All":
+            pos = np.intersect1d(pos, self.by_category.get(category_filter, []), assume_unique=True)
+        return pos
+
+
+@traced("apply_filters", "transform")
+def apply_filters(df, search_text, status_filter, category_filter, index=None):
+    if index is not None:
+        return df.take(index.query(search_text, status_filter, category_filter))
+
+    df_show = df.copy()
+
+    if search_text:
+        kw = search_text.lower().strip()
+        df_show = df_show[
+            df_show["staff_name"].astype(str).str.lower().str.contains(kw, na=False) |
+            df_show["issue_detail"].astype(str).str.lower().str.contains(kw, na=False) |
+            df_show["related_to"].astype(str).str.lower().str.contains(kw, na=False) |
+            df_show["category"].astype(str).str.lower().str.contains(kw, na=False) |
+            df_show["display_no"].astype(str).str.lower().str.contains(kw, na=False)
+        ]
+
+    if status_filter != "All":
+        df_show = df_show[df_show["status"] == status_filter]
+
+    if category_filter != "All":
+        df_show = df_show[df_show["category"] == category_filter]
+
+    return df_show
+
+
+# =========================
+# Server-side filtering and paging
+# =========================
+PAGE_CACHE_TTL = 30
+PAGE_CACHE_ENTRIES = 64
+
+
+def _search_or(search):
+    # Same columns as SearchIndex; values are double-quoted so commas and
+    # brackets in the keyword cannot break the PostgREST or=() syntax.
+    kw = (search or "").strip().replace("*", "").replace("%", "")
+    if not kw:
+        return None
+    # "_" and backslash are LIKE metacharacters: escape them so the keyword
+    # matches literally, then quote the result for PostgREST.
+    kw = kw.replace("\\", "\\\\").replace("_", "\\_")
+    kw = kw.replace("\\", "\\\\").replace('"', '\\"')
+    return ",".join(f'{col}.ilike."*{kw}*"' for col in SEARCH_COLS)
+
+
+def apply_server_filters(q, search=None, status=None, category=None):
+    # "All" and empty values mean no filter, matching the selectboxes.
+    cond = _search_or(search)
+    if cond:
+        q = q.or_(cond)
+    if status and status != "All":
+        q = q.eq("status", status)
+    if category and category != "All":
+        q = q.eq("category", category)
+    return q
+
+
+class PagedIssueQuery:
+    """Per-process cache of filtered issue pages fetched with range() + exact count.
+
+    Keys are ``(search, status, category, page, page_size)``. After each fetch
+    the next page is loaded on a worker thread so a page turn is a cache hit;
+    a fetch for a page already in flight waits for that request instead of
+    sending another. ``clear()`` bumps a generation counter; requests started
+    before it are not shared with later fetches and their results are dropped.
+    """
+
+    def __init__(self, client, table=TABLE_NAME, ttl=PAGE_CACHE_TTL, max_entries=PAGE_CACHE_ENTRIES):
+        self.client = client
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="issue-page")
+
+    def fetch(self, search, status, category, page, page_size):
+        key = ((search or "").strip(), status, category, int(page), page_size)
+        df, total = self._get(key)
+        if page_size and page * page_size < total:
+            self._prefetch((key[0], status, category, int(page) + 1, page_size))
+        return df, total
+
+    def status_counts(self) -> dict:
+        counts = {}
+        for status in ("Open", "Closed", "Cancel"):
+            res = (
+                self.client.table(self.table)
+                .select("id", count="exact", head=True)
+                .eq("status", status)
+                .execute()
+            )
+            counts[status] = res.count or 0
+        return counts
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.cache.clear()
+
+    def _get(self, key):
+        with self.lock:
+            hit = self.cache.get(key)
+            if hit and time.monotonic() - hit[0] < self.ttl:
+                self.cache.move_to_end(key)
+                return hit[1], hit[2]
+        return self._submit(key).result()
+
+    def _prefetch(self, key):
+        with self.lock:
+            hit = self.cache.get(key)
+            if hit and time.monotonic() - hit[0] < self.ttl:
+                return
+        self._submit(key)
+
+    def _submit(self, key):
+        with self.lock:
+            gen = self.generation
+            fut = self.inflight.get((gen, key))
+            if fut is None:
+                fut = self.pool.submit(self._load, key, gen)
+                self.inflight[(gen, key)] = fut
+            return fut
+
+    def _load(self, key, gen):
+        search, status, category, page, page_size = key
+        try:
+            if page_size:
+                q = self.client.table(self.table).select(ISSUE_COLS, count="exact")
+                q = apply_server_filters(q, search, status, category).order("id", desc=True)
+                res = q.range((page - 1) * page_size, page * page_size - 1).execute()
+                df = normalize_issues(pd.DataFrame(res.data))
+                total = res.count if res.count is not None else len(df)
+            else:
+                # "All": walk keyset pages so the PostgREST row cap cannot cut it short.
+                frames = list(iter_issue_pages(self.client, self.table, status=status, category=category, search=search))
+                df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+                total = len(df)
+
+            with self.lock:
+                # Started before a clear(): the caller gets it, the cache does not.
+                if gen == self.generation:
+                    self.cache[key] = (time.monotonic(), df, total)
+                    self.cache.move_to_end(key)
+                    while len(self.cache) > self.max_entries:
+                        self.cache.popitem(last=False)
+            return df, total
+        finally:
+            with self.lock:
+                self.inflight.pop((gen, key), None)
+
+
+# =========================
+# Export pipeline (CSV / Excel)
+# =========================
+EXPORT_COLS = [
+    "display_no", "staff_name", "category", "issue_detail", "related_to",
+    "status", "likes", "Create Date", "Create Time", "Complete Date", "Pending Days"
+]
+EXPORT_HEADERS = [
+    "Running No", "Staff Name", "Category", "Detail", "Severity",
+    "Status", "Likes", "Create Date", "Create Time", "Complete Date", "Pending Days"
+]
+
+
+def _strftime_unique(values: pd.Series, fmt: str) -> np.ndarray:
+    # Format each distinct timestamp once; dates repeat heavily across issues.
+    codes, uniques = pd.factorize(values)
+    labels = np.append(pd.DatetimeIndex(uniques).strftime(fmt).to_numpy(dtype=object), "")
+    return labels[codes]
+
+
+_CLOCK_LABELS = np.array(
+    [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)] + [""],
+    dtype=object,
+)
+
+
+def _clock_labels(values: pd.Series) -> np.ndarray:
+    # "%H:%M:%S" via a lookup on seconds-of-day; NaT maps to the trailing "".
+    secs = (values - values.dt.normalize()).dt.total_seconds()
+    return _CLOCK_LABELS[secs.fillna(86400).astype("int64").to_numpy()]
+
+
+def build_export_frame(dataframe: pd.DataFrame, now=None) -> pd.DataFrame:
+    now = pd.Timestamp(now).tz_convert(LOCAL_TZ) if now is not None else pd.Timestamp.now(tz=LOCAL_TZ)
+    df_ex = dataframe
+
+    if "display_no" in df_ex.columns:
+        display_no = df_ex["display_no"]
+    else:
+        display_no = df_ex["id"].map(lambda x: f"{x:03d}")
+
+    created = df_ex["created_at"]
+    updated = df_ex["updated_at"]
+    closed = (df_ex["status"] == "Closed").to_numpy()
+
+    end = updated.where(closed, now)
+    days = (end - created).dt.days.fillna(0).clip(lower=0).astype("int64")
+
+    out = pd.DataFrame({
+        "display_no": display_no,
+        "staff_name": df_ex["staff_name"],
+        "category": df_ex["category"],
+        "issue_detail": df_ex["issue_detail"],
+        "related_to": df_ex["related_to"],
+        "status": df_ex["status"],
+        "likes": df_ex["likes"],
+        "Create Date": _strftime_unique(created.dt.normalize(), "%d-%b-%y"),
+        "Create Time": _clock_labels(created),
+        "Complete Date": np.where(closed, _strftime_unique(updated.dt.normalize(), "%d-%b-%y"), "Processing"),
+        "Pending Days": days.astype(str) + " days",
+    }, index=df_ex.index)
+
+    out = out[EXPORT_COLS]
+    out.columns = EXPORT_HEADERS
+    return out
+
+
+@traced("export_xlsx_plain", "transform")
+def export_xlsx_plain(dataframe: pd.DataFrame) -> bytes:
+    output = io.BytesIO()
+
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        build_export_frame(dataframe).to_excel(writer, sheet_name="Issue_Report", index=False)
+
+    return output.getvalue()
+
+
+@traced("export_xlsx_with_images", "transform")
+def export_xlsx_with_images(dataframe: pd.DataFrame, cache=None, fileobj=None):
+    """Excel export with a thumbnail per row; returns ``(bytes, failed_rows)``.
+
+    With ``fileobj`` the workbook is written there and ``(None, failed_rows)``
+    is returned, so the caller does not hold the file in memory.
+    """
+    output = fileobj if fileobj is not None else io.BytesIO()
+    images, failures = download_images(dataframe["image_url"].tolist(), cache=cache)
+
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        df_final = build_export_frame(dataframe)
+        df_final.to_excel(writer, sheet_name="Issue_Report", index=False)
+
+        worksheet = writer.sheets["Issue_Report"]
+        worksheet.set_column("A:A", 14)
+        worksheet.set_column("B:B", 20)
+        worksheet.set_column("C:C", 12)
+        worksheet.set_column("D:D", 40)
+        worksheet.set_column("E:E", 12)
+        worksheet.set_column("F:F", 12)
+        worksheet.set_column("G:G", 10)
+        worksheet.set_column("H:K", 15)
+        worksheet.set_column("L:L", 21)
+        worksheet.write(0, 11, "Image")
+        worksheet.set_default_row(80)
+
+        for i, url in enumerate(dataframe["image_url"]):
+            if i in images:
+                try:
+                    worksheet.insert_image(
+                        i + 1, 11, url,
+                        {
+                            "image_data": io.BytesIO(images[i]),
+                            "x_offset": 5,
+                            "y_offset": 5
+                        }
+                    )
+                except Exception as e:
+                    failures[i] = f"embed failed: {e}"
+            if i in failures:
+                worksheet.write(i + 1, 11, failures[i])
+
+    failed_rows = [
+        {"Running No": df_final["Running No"].iloc[i], "Reason": reason}
+        for i, reason in sorted(failures.items())
+    ]
+    return (output.getvalue() if fileobj is None else None), failed_rows
+
+
+# =========================
+# Streaming export (large tables)
+# =========================
+EXPORT_PAGE_SIZE = 1000
+
+
+def iter_issue_pages(client, table=TABLE_NAME, page_size=EXPORT_PAGE_SIZE, status=None, category=None, search=None):
+    # Newest first, keyset on id so each page is one indexed range scan.
+    cursor = None
+    while True:
+        q = apply_server_filters(client.table(table).select(ISSUE_COLS), search, status, category)
+        if cursor is not None:
+            q = q.lt("id", cursor)
+        res = q.order("id", desc=True).limit(page_size).execute()
+        if not res.data:
+            return
+        yield normalize_issues(pd.DataFrame(res.data))
+        if len(res.data) < page_size:
+            return
+        cursor = res.data[-1]["id"]
+
+
+def stream_export_xlsx(pages, fileobj) -> int:
+    """Write export rows page by page with xlsxwriter's constant_memory mode.
+
+    Only the current page is held in memory; returns the number of rows written.
+    """
+    workbook = xlsxwriter.Workbook(fileobj, {"constant_memory": True})
+    worksheet = workbook.add_worksheet("Issue_Report")
+    worksheet.write_row(0, 0, EXPORT_HEADERS)
+
+    row = 1
+    for page in pages:
+        if page.empty:
+            continue
+        out = build_export_frame(page).astype(object)
+        out = out.where(out.notna(), None)
+        for values in out.itertuples(index=False, name=None):
+            worksheet.write_row(row, 0, values)
+            row += 1
+
+    workbook.close()
+    return row - 1
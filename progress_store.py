@@ -0,0 +1,510 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from schema import PROGRESS_SCHEMA, TASK_SCHEMA, apply_schema, select_cols
+from snapshot_store import Snapshot, schema_tag
+from tracing import span, submit_in_context, traced
+
+# =========================
+# Data layer for construction_progress / task_master (MJRV14)
+# =========================
+PROGRESS_TABLE = "construction_progress"
+TASK_TABLE = "task_master"
+LOCAL_TZ = "Asia/Bangkok"
+
+# Keep below the PostgREST max-rows setting so a full page is never silently cut.
+PAGE_SIZE = 1000
+MAX_WORKERS = 4
+# Reruns within this many seconds of the last sync reuse the in-memory tables.
+SYNC_MAX_AGE = 5
+# While the change feed is live, still sync this often: the channel joins but
+# stays silent if the publication (sql/realtime.sql) was never applied.
+LIVE_SYNC_MAX_AGE = 300
+
+
+def _id_bounds(client, table):
+    first = client.table(table).select("id").order("id").limit(1).execute()
+    last = client.table(table).select("id").order("id", desc=True).limit(1).execute()
+    if not first.data or not last.data:
+        return None, None
+    return int(first.data[0]["id"]), int(last.data[0]["id"])
+
+
+def _fetch_range(client, table, columns, lo, hi, page_size):
+    # Keyset walk inside [lo, hi): each page restarts after the last id seen, so
+    # sparse or dense id ranges both come back complete.
+    frames, pages, cursor = [], 0, lo
+    while cursor < hi:
+        res = (
+            client.table(table)
+            .select(columns)
+            .gte("id", cursor)
+            .lt("id", hi)
+            .order("id")
+            .limit(page_size)
+            .execute()
+        )
+        pages += 1
+        if not res.data:
+            break
+        frames.append(pd.DataFrame(res.data))
+        if len(res.data) < page_size:
+            break
+        cursor = int(res.data[-1]["id"]) + 1
+    return frames, pages
+
+
+def fetch_table(client, table, columns="*", page_size=PAGE_SIZE, max_workers=MAX_WORKERS):
+    """Fetch a whole table as id-keyset pages, several ranges at a time.
+
+    Returns ``(df, stats)`` where stats holds the rows and pages fetched and the
+    server's exact row count, so a short load shows up as ``truncated``.
+    """
+    with span(f"fetch {table}", "data") as sp:
+        expected = client.table(table).select("id", count="exact", head=True).execute().count
+        lo, hi = _id_bounds(client, table)
+        if lo is None:
+            return pd.DataFrame(), {"table": table, "rows": 0, "pages": 0, "expected": expected or 0, "truncated": bool(expected)}
+
+        # Split the id span into one range per expected page; ranges run in parallel.
+        n_ranges = max(1, -(-(expected or 1) // page_size))
+        step = max(1, -(-(hi - lo + 1) // n_ranges))
+        bounds = [(start, min(start + step, hi + 1)) for start in range(lo, hi + 1, step)]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [submit_in_context(pool, _fetch_range, client, table, columns, a, b, page_size) for a, b in bounds]
+            results = [f.result() for f in futures]
+
+        frames = [f for fs, _ in results for f in fs]
+        pages = sum(p for _, p in results)
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        sp["rows"] = len(df)
+
+    stats = {
+        "table": table,
+        "rows": len(df),
+        "pages": pages,
+        "expected": expected if expected is not None else len(df),
+    }
+    stats["truncated"] = stats["rows"] < stats["expected"]
+    return df, stats
+
+
+PROGRESS_COLS = select_cols(PROGRESS_SCHEMA)
+TASK_MASTER_COLS = select_cols(TASK_SCHEMA)
+# float32 keeps ~7 significant digits; values leaving the frame are rounded
+# back so 33.3 is not shown as 33.29999923706055.
+QTY_DECIMALS = 4
+
+
+@traced("normalize_progress", "transform")
+def normalize_progress(df_prog: pd.DataFrame) -> pd.DataFrame:
+    if not df_prog.empty:
+        df_prog["created_at"] = pd.to_datetime(df_prog["created_at"]).dt.tz_convert(LOCAL_TZ).dt.tz_localize(None)
+    return apply_schema(df_prog, PROGRESS_SCHEMA)
+
+
+def round_qty(df: pd.DataFrame) -> pd.DataFrame:
+    """Quantity columns as float64 rounded to QTY_DECIMALS, for display."""
+    qty = [c for c in ("status", "total_qty") if c in df.columns]
+    return df.astype({c: "float64" for c in qty}).round({c: QTY_DECIMALS for c in qty})
+
+
+# =========================
+# Lookups for the upload form
+# =========================
+@traced("build_lookups", "transform")
+def build_lookups(df_task) -> dict:
+    """category -> task names and task -> (total_qty, unit)."""
+    lookups = {"categories": [], "tasks_by_category": {}, "task_info": {}}
+    if df_task.empty:
+        return lookups
+
+    lookups["categories"] = sorted(df_task["category"].dropna().unique().tolist())
+    lookups["tasks_by_category"] = df_task.groupby("category", sort=False, observed=True)["task_name"].agg(list).to_dict()
+
+    # First row per task wins, as with the old .iloc[0] lookup.
+    info = df_task.drop_duplicates("task_name")
+    lookups["task_info"] = {
+        t: (round(float(q), QTY_DECIMALS), u) for t, q, u in zip(info["task_name"], info["total_qty"], info["unit"])
+    }
+    return lookups
+
+
+@traced("latest_by_task", "transform")
+def latest_by_task(df_prog) -> dict:
+    valid = df_prog.dropna(subset=["created_at"])
+    if valid.empty:
+        return {}
+    rows = round_qty(valid.loc[valid.groupby("task_name", sort=False, observed=True)["created_at"].idxmax()])
+    return {r["task_name"]: r for r in rows.to_dict("records")}
+
+
+# =========================
+# Incremental sync + latest-per-task snapshot
+# =========================
+_NO_UPPER_ID = 2 ** 62
+
+
+class ProgressSync:
+    """Keeps both tables in memory and pulls only new progress rows.
+
+    construction_progress is insert-only, so rows with ``id`` above the
+    high-water mark are the whole delta. ``latest`` (task -> newest progress
+    row) is updated from those rows alone, so readers get the current state of
+    every task in O(tasks). If the server row count ever disagrees with the
+    local one (e.g. rows deleted by hand) the next refresh reloads everything.
+    task_master is small and simply re-read each time.
+
+    Rows the app inserts itself are added write-through with ``apply_insert``.
+    With a realtime change feed attached (``set_live`` / ``apply_change``) the
+    tables are patched from its events and not polled at all; polling resumes
+    whenever the feed is down, and one poll after each (re)subscribe catches up
+    on events sent while it was not listening.
+
+    ``peek`` returns the last complete snapshot without taking the lock; it is
+    republished after every refresh and patch, never halfway through one.
+
+    With a ``snapshot_backend`` both frames and the id high-water mark are
+    saved after syncs; ``restore`` starts a new process from them. With a
+    shared backend, replicas adopt each other's syncs and only the lease
+    holder polls the tables (see IssueSync).
+    """
+
+    def __init__(self, client, snapshot_backend=None):
+        self.client = client
+        self.snapshot = (
+            Snapshot("progress", schema_tag(PROGRESS_SCHEMA, TASK_SCHEMA), snapshot_backend) if snapshot_backend else None
+        )
+        self.df_prog = pd.DataFrame()
+        self.df_task = pd.DataFrame()
+        self.latest = {}
+        self.stats = []
+        self.hwm = None
+        self.version = 0
+        self.synced_at = 0.0
+        self.live = False
+        self.resync = False
+        self.published = None
+        self.patched_at = 0.0
+        self.lock = threading.Lock()
+
+    def needs_sync(self, max_age: float = 0) -> bool:
+        if self.hwm is None or not max_age or self.resync:
+            return True
+        age = time.monotonic() - self.synced_at
+        return age >= (max(max_age, LIVE_SYNC_MAX_AGE) if self.live else max_age)
+
+    def peek(self):
+        """The last published snapshot, or None before the first load."""
+        return self.published
+
+    def refresh(self, max_age: float = 0):
+        """Return ``(df_prog, df_task, stats, version, latest)``.
+
+        With ``max_age`` the sync is skipped if the last one is that recent,
+        or while the change feed is live.
+        """
+        with self.lock:
+            if not self.needs_sync(max_age):
+                return self._snapshot()
+            shared = self.snapshot is not None and self.snapshot.shared
+            if shared and self.hwm is not None:
+                if self._adopt(self.snapshot.newer(self.patched_at)):
+                    self._publish()
+                if not self.needs_sync(max_age):
+                    return self._snapshot()
+                if not self.snapshot.acquire():
+                    # Another replica is refreshing; its result is adopted on a later call.
+                    return self._snapshot()
+            try:
+                return self._sync()
+            finally:
+                if shared:
+                    self.snapshot.release()
+
+    def _sync(self):
+        started = time.time()
+        self.resync = False
+        df_task, task_stats = fetch_table(self.client, TASK_TABLE, TASK_MASTER_COLS)
+        df_task = apply_schema(df_task, TASK_SCHEMA)
+        if not df_task.equals(self.df_task):
+            self.df_task = df_task
+            self.version += 1
+
+        if self.hwm is None:
+            df_prog, prog_stats = fetch_table(self.client, PROGRESS_TABLE, PROGRESS_COLS)
+            self.df_prog = normalize_progress(df_prog)
+            self.latest = latest_by_task(self.df_prog) if not self.df_prog.empty else {}
+            self.version += 1
+        else:
+            prog_stats = self._apply_delta()
+
+        self.hwm = int(self.df_prog["id"].max()) if not self.df_prog.empty else 0
+        if prog_stats["rows"] != prog_stats["expected"]:
+            self.hwm = None
+
+        self.stats = [prog_stats, task_stats]
+        self.synced_at = time.monotonic()
+        if self.snapshot is not None and self.hwm is not None:
+            self.snapshot.maybe_save(self.version, lambda: (
+                {"progress": self.df_prog, "tasks": self.df_task},
+                {"watermark": self.hwm, "stats": self.stats, "sync_started": started},
+            ))
+        return self._publish()
+
+    def restore(self) -> bool:
+        """Start from the stored snapshot, if there is one.
+
+        A private snapshot is caught up by the next refresh; a shared one is as
+        fresh as its last sync by any replica.
+        """
+        if self.snapshot is None:
+            return False
+        with self.lock:
+            if self.hwm is not None:
+                return False
+            if not self._adopt(self.snapshot.load(), resync=not self.snapshot.shared):
+                return False
+            self._publish()
+        return True
+
+    def _adopt(self, loaded, resync=False) -> bool:
+        if loaded is None:
+            return False
+        frames, meta = loaded
+        if frames is not None:
+            self.df_prog = apply_schema(frames["progress"], PROGRESS_SCHEMA)
+            self.df_task = apply_schema(frames["tasks"], TASK_SCHEMA)
+            self.latest = latest_by_task(self.df_prog) if not self.df_prog.empty else {}
+            self.hwm = int(meta["watermark"])
+            self.version += 1
+            self.snapshot.saved_version = self.version
+        self.stats = meta.get("stats") or self.stats
+        if resync:
+            self.resync = True
+        self.synced_at = self.snapshot.synced_at(meta)
+        return True
+
+    def _snapshot(self):
+        return self.df_prog, self.df_task, self.stats, self.version, self.latest
+
+    def _publish(self):
+        self.published = self._snapshot()
+        return self.published
+
+    def apply_insert(self, rows):
+        """Append rows returned by an insert; the next delta skips them by id."""
+        if not rows:
+            return
+        with self.lock:
+            self.patched_at = time.time()
+            self._append(normalize_progress(pd.DataFrame(rows)))
+            if self.published is not None:
+                self._publish()
+
+    def _append(self, delta):
+        if not self.df_prog.empty:
+            delta = delta[~delta["id"].isin(self.df_prog["id"])]
+        if delta.empty:
+            return
+        # Categories of the two frames differ, so the concat is re-typed.
+        self.df_prog = apply_schema(pd.concat([self.df_prog, delta], ignore_index=True), PROGRESS_SCHEMA)
+
+        latest = dict(self.latest)
+        for task, row in latest_by_task(delta).items():
+            cur = latest.get(task)
+            if cur is None or row["created_at"] >= cur["created_at"]:
+                latest[task] = row
+        self.latest = latest
+        self.version += 1
+
+    # --- change feed ---
+    def set_live(self, live: bool):
+        with self.lock:
+            self.live = live
+            if live:
+                self.resync = True
+
+    def apply_change(self, table, kind, record, old_record):
+        """Apply one INSERT / UPDATE / DELETE event from the change feed."""
+        with self.lock:
+            if self.hwm is None:
+                return  # the first full load has not run; it will see the row
+            self.patched_at = time.time()
+            if table == TASK_TABLE:
+                self._apply_task_change(kind, record, old_record)
+            elif table == PROGRESS_TABLE:
+                self._apply_progress_change(kind, record, old_record)
+            self._publish()
+
+    def _apply_task_change(self, kind, record, old_record):
+        rid = (old_record if kind == "DELETE" else record).get("id")
+        df = self.df_task
+        if df.empty and kind == "DELETE":
+            return
+        if not df.empty:
+            df = df[df["id"] != rid]
+        if kind != "DELETE":
+            df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
+        self.df_task = apply_schema(df, TASK_SCHEMA).sort_values("id", ignore_index=True)
+        self.version += 1
+
+    def _apply_progress_change(self, kind, record, old_record):
+        if kind == "INSERT":
+            self._append(normalize_progress(pd.DataFrame([record])))
+            return
+
+        rid = (old_record if kind == "DELETE" else record).get("id")
+        hit = self.df_prog["id"] == rid if not self.df_prog.empty else None
+        tasks = set(self.df_prog.loc[hit, "task_name"]) if hit is not None else set()
+        df = self.df_prog[~hit] if hit is not None else self.df_prog
+        if kind == "UPDATE":
+            row = normalize_progress(pd.DataFrame([record]))
+            tasks |= set(row["task_name"])
+            df = pd.concat([df, row], ignore_index=True)
+        self.df_prog = apply_schema(df, PROGRESS_SCHEMA).reset_index(drop=True)
+
+        latest = {t: r for t, r in self.latest.items() if t not in tasks}
+        latest.update(latest_by_task(self.df_prog[self.df_prog["task_name"].isin(list(tasks))]))
+        self.latest = latest
+        self.version += 1
+
+    def _apply_delta(self):
+        frames, pages = _fetch_range(self.client, PROGRESS_TABLE, PROGRESS_COLS, self.hwm + 1, _NO_UPPER_ID, PAGE_SIZE)
+        if frames:
+            self._append(normalize_progress(pd.concat(frames, ignore_index=True)))
+
+        expected = self.client.table(PROGRESS_TABLE).select("id", count="exact", head=True).execute().count
+        rows = len(self.df_prog)
+        return {
+            "table": PROGRESS_TABLE,
+            "rows": rows,
+            "pages": pages,
+            "expected": expected if expected is not None else rows,
+            "truncated": expected is not None and rows < expected,
+        }
+
+
+def latest_frame(latest: dict, start_d, end_d):
+    """Latest row per task with its date in [start_d, end_d], newest first.
+
+    Returns None when ``end_d`` is before the newest update: a task's latest row
+    may then be out of range while an older one is in it, which needs history.
+    """
+    if not latest:
+        return pd.DataFrame()
+    snap = pd.DataFrame(list(latest.values()))
+    if end_d < snap["created_at"].max().date():
+        return None
+    d = snap["created_at"].dt.date
+    return snap[(d >= start_d) & (d <= end_d)].sort_values("created_at", ascending=False)
+
+
+def in_date_range(df, start_d, end_d):
+    """Rows whose local ``created_at`` date is in [start_d, end_d].
+
+    Compares timestamps against the day bounds instead of building ``.dt.date``
+    objects for every row.
+    """
+    tz = df["created_at"].dt.tz
+    lo = pd.Timestamp(start_d).tz_localize(tz)
+    hi = pd.Timestamp(end_d).tz_localize(tz) + pd.Timedelta(days=1)
+    return df[(df["created_at"] >= lo) & (df["created_at"] < hi)]
+
+
+# =========================
+# Photo gallery
+# =========================
+@traced("photo_rows", "transform")
+def photo_rows(df_prog):
+    """Rows with an uploaded photo, newest first."""
+    photos = df_prog[df_prog["image_url"].str.startswith("http", na=False)]
+    return photos.sort_values("created_at", ascending=False)
+
+
+@traced("group_photos", "transform")
+def group_photos(photos):
+    """task -> row positions in ``photos`` (as from photo_rows), from one groupby."""
+    return photos.groupby("task_name", sort=False, observed=True).indices
+
+
+# =========================
+# Task Master import
+# =========================
+TASK_IMPORT_RPC = "import_task_master"
+TASK_COLS = ["task_name", "category", "total_qty", "unit"]
+IMPORT_CHUNK = 500
+
+
+def _task_records(df) -> dict:
+    # task_name -> comparable record; blank names are dropped, first row per name wins.
+    if df.empty:
+        return {}
+    df = df[TASK_COLS].copy()
+    df["task_name"] = df["task_name"].astype("string").str.strip()
+    df = df[df["task_name"].fillna("") != ""].drop_duplicates("task_name")
+    df["total_qty"] = pd.to_numeric(df["total_qty"], errors="coerce").astype(float)
+    out = {}
+    for r in df.to_dict("records"):
+        out[str(r["task_name"])] = {
+            "task_name": str(r["task_name"]),
+            "category": None if pd.isna(r["category"]) else str(r["category"]).strip(),
+            "total_qty": None if pd.isna(r["total_qty"]) else float(r["total_qty"]),
+            "unit": None if pd.isna(r["unit"]) else str(r["unit"]).strip(),
+        }
+    return out
+
+
+def read_task_sheet(fileobj) -> pd.DataFrame:
+    df = pd.read_excel(fileobj).iloc[:, 0:4]
+    df.columns = TASK_COLS
+    return df
+
+
+def diff_task_master(df_current, df_imp):
+    """Compare a sheet with task_master by task_name.
+
+    Returns ``(upserts, deletes, counts)``: records to insert or update, names
+    to remove, and ``{"added", "changed", "removed", "unchanged"}``.
+    """
+    cur, new = _task_records(df_current), _task_records(df_imp)
+    added = [r for name, r in new.items() if name not in cur]
+    changed = [r for name, r in new.items() if name in cur and cur[name] != r]
+    deletes = [name for name in cur if name not in new]
+    counts = {
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(deletes),
+        "unchanged": len(new) - len(added) - len(changed),
+    }
+    return added + changed, deletes, counts
+
+
+def import_task_master(client, df_imp, rpc_name=TASK_IMPORT_RPC):
+    """Apply an uploaded sheet to task_master and return the diff counts.
+
+    Only the difference is sent, in one ``rpc_name`` call (one transaction, see
+    sql/task_master_import.sql). Projects without the function fall back to
+    chunked bulk upserts and deletes, which are not atomic.
+    Needs the unique index on task_name either way.
+    """
+    df_current, _ = fetch_table(client, TASK_TABLE, ",".join(["id"] + TASK_COLS))
+    upserts, deletes, counts = diff_task_master(df_current, df_imp)
+    if not upserts and not deletes:
+        return counts
+
+    try:
+        client.rpc(rpc_name, {"p_upserts": upserts, "p_deletes": deletes}).execute()
+    except Exception as e:
+        # PGRST202: function not found in the schema cache.
+        if getattr(e, "code", None) != "PGRST202":
+            raise
+        for i in range(0, len(upserts), IMPORT_CHUNK):
+            client.table(TASK_TABLE).upsert(upserts[i:i + IMPORT_CHUNK], on_conflict="task_name").execute()
+        for i in range(0, len(deletes), IMPORT_CHUNK):
+            client.table(TASK_TABLE).delete().in_("task_name", deletes[i:i + IMPORT_CHUNK]).execute()
+    return counts
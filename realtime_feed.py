@@ -0,0 +1,140 @@
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+from websockets.sync.client import connect
+
+# =========================
+# Supabase Realtime change feed (Phoenix channel protocol, JSON v1)
+# =========================
+# Tables must be in the supabase_realtime publication, see sql/realtime.sql.
+HEARTBEAT_SECONDS = 25
+JOIN_TIMEOUT = 10
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 60
+# Points the feed at another server, e.g. a local websocket stand-in.
+REALTIME_URL = os.environ.get("SUPABASE_REALTIME_URL")
+
+
+def realtime_url(supabase_url: str, key: str) -> str:
+    if REALTIME_URL:
+        return REALTIME_URL
+    base = re.sub(r"^http", "ws", supabase_url.rstrip("/"), flags=re.IGNORECASE)
+    return f"{base}/realtime/v1/websocket?apikey={key}&vsn=1.0.0"
+
+
+class ChangeFeed:
+    """Insert/update/delete events for ``tables`` from a background thread.
+
+    ``on_change(table, type, record, old_record)`` is called per event, with
+    type one of INSERT / UPDATE / DELETE. ``on_status(live)`` is called when
+    the subscription is confirmed (True) and when it drops (False); events
+    sent while the feed was down are lost, so callers resync on True.
+    The thread reconnects with exponential backoff for as long as it runs.
+    """
+
+    def __init__(self, url, key, tables, on_change, on_status=None, schema="public", topic="realtime:app"):
+        self.url = url
+        self.key = key
+        self.tables = list(tables)
+        self.schema = schema
+        self.topic = topic
+        self.on_change = on_change
+        self.on_status = on_status
+        self.live = False
+        self.last_error = None
+        self.events = 0
+        self._refs = itertools.count(1)
+        self._stop = threading.Event()
+        self._ws = None
+        self._thread = threading.Thread(target=self._run, daemon=True, name="realtime-feed")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+
+    def _send(self, ws, topic, event, payload, join_ref=None):
+        ref = str(next(self._refs))
+        if event == "phx_join":
+            join_ref = ref
+        ws.send(json.dumps({"topic": topic, "event": event, "payload": payload, "ref": ref, "join_ref": join_ref}))
+        return ref
+
+    def _join(self, ws):
+        config = {
+            "broadcast": {"self": False},
+            "presence": {"key": ""},
+            "postgres_changes": [{"event": "*", "schema": self.schema, "table": t} for t in self.tables],
+        }
+        ref = self._send(ws, self.topic, "phx_join", {"config": config, "access_token": self.key})
+        deadline = time.monotonic() + JOIN_TIMEOUT
+        while True:
+            msg = json.loads(ws.recv(timeout=max(0.1, deadline - time.monotonic())))
+            if msg.get("event") == "phx_reply" and msg.get("ref") == ref:
+                payload = msg.get("payload") or {}
+                if payload.get("status") != "ok":
+                    raise RuntimeError(f"join refused: {payload.get('response')}")
+                return ref
+
+    def _set_live(self, live):
+        if live == self.live:
+            return
+        self.live = live
+        if self.on_status:
+            self.on_status(live)
+
+    def _listen(self, ws):
+        next_beat = time.monotonic() + HEARTBEAT_SECONDS
+        while not self._stop.is_set():
+            try:
+                raw = ws.recv(timeout=max(0.1, next_beat - time.monotonic()))
+            except TimeoutError:
+                self._send(ws, "phoenix", "heartbeat", {})
+                next_beat = time.monotonic() + HEARTBEAT_SECONDS
+                continue
+
+            msg = json.loads(raw)
+            event = msg.get("event")
+            if msg.get("topic") != self.topic:
+                continue
+            if event in ("phx_close", "phx_error"):
+                raise RuntimeError(f"channel {event}")
+            if event != "postgres_changes":
+                continue
+
+            data = (msg.get("payload") or {}).get("data") or {}
+            if data.get("table") not in self.tables:
+                continue
+            self.events += 1
+            self.on_change(data["table"], data.get("type"), data.get("record") or {}, data.get("old_record") or {})
+
+    def _run(self):
+        backoff = RECONNECT_MIN_SECONDS
+        while not self._stop.is_set():
+            try:
+                with connect(self.url, open_timeout=JOIN_TIMEOUT, close_timeout=1) as ws:
+                    self._ws = ws
+                    self._join(ws)
+                    self.last_error = None
+                    backoff = RECONNECT_MIN_SECONDS
+                    self._set_live(True)
+                    self._listen(ws)
+            except Exception as e:
+                # Includes a failing on_change: reconnecting makes the caller resync.
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                self._ws = None
+                self._set_live(False)
+
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
@@ -0,0 +1,72 @@
+import pandas as pd
+
+# =========================
+# Column schemas for the in-memory frames
+# =========================
+# Only these columns are selected and kept. Low-cardinality text becomes
+# categorical, quantities float32 and counters int32; ids stay int64 (bigint
+# in Postgres). Timestamps are parsed by the stores' normalize_* functions.
+PROGRESS_SCHEMA = {
+    "id": "int64",
+    "task_name": "category",
+    "category": "category",
+    "update_by": "category",
+    "status": "float32",
+    "total_qty": "float32",
+    "unit": "category",
+    "image_url": "str",
+    "created_at": None,
+}
+
+TASK_SCHEMA = {
+    "id": "int64",
+    "task_name": "str",
+    "category": "category",
+    "total_qty": "float32",
+    "unit": "category",
+}
+
+ISSUE_SCHEMA = {
+    "id": "int64",
+    "display_no": "str",
+    "category_seq": "Int32",
+    "staff_name": "category",
+    "category": "category",
+    "issue_detail": "str",
+    "related_to": "category",
+    "image_url": "str",
+    "status": "category",
+    "likes": "int32",
+    "created_at": None,
+    "updated_at": None,
+    "changed_at": None,
+}
+
+
+def select_cols(schema: dict) -> str:
+    return ",".join(schema)
+
+
+def apply_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Project ``df`` to the schema columns it has and cast them.
+
+    Safe to re-apply, e.g. after a concat turned categoricals back into object.
+    """
+    if df.empty:
+        return df
+    df = df[[c for c in schema if c in df.columns]].copy()
+    for col in df.columns:
+        dtype = schema[col]
+        if dtype is None or df[col].dtype == dtype:
+            continue
+        if dtype == "category":
+            df[col] = df[col].astype("category")
+        elif dtype in ("int64", "int32"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(dtype)
+        elif dtype == "Int32":
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype(dtype)
+        elif dtype == "float32":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from tracing import span
+
+
+# =========================
+# Single-flight call coalescing
+# =========================
+class SingleFlight:
+    """At most one call per key runs at a time; concurrent callers share it.
+
+    ``submit`` runs ``fn`` on an executor and returns its future; callers
+    arriving while it runs get that same future, so its result or error
+    reaches all of them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.runs = 0
+        self.joined = 0
+
+    def submit(self, key, fn, executor) -> Future:
+        with self.lock:
+            fut = self.inflight.get(key)
+            if fut is not None:
+                self.joined += 1
+                return fut
+            fut = self.inflight[key] = Future()
+            self.runs += 1
+        executor.submit(self._run, key, fn, fut)
+        return fut
+
+    def _run(self, key, fn, fut):
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, fut, error=e)
+            return
+        self._finish(key, fut, result=result)
+
+    def busy(self) -> bool:
+        with self.lock:
+            return bool(self.inflight)
+
+    def _finish(self, key, fut, result=None, error=None):
+        with self.lock:
+            del self.inflight[key]
+        if error is None:
+            fut.set_result(result)
+        else:
+            fut.set_exception(error)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"runs": self.runs, "joined": self.joined, "inflight": len(self.inflight)}
+
+
+# =========================
+# Stale-while-revalidate
+# =========================
+def age_text(seconds: float) -> str:
+    if seconds < 90:
+        return f"{seconds:.0f} s"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+class Revalidator:
+    """Serve a sync object's last good snapshot and refresh it in the background.
+
+    ``source`` provides ``refresh(max_age)``, ``peek()``, ``needs_sync(max_age)``
+    and ``synced_at`` (monotonic), as IssueSync and ProgressSync do. A stale
+    ``get`` starts one background sync and waits for it at most ``budget``
+    seconds; past that, or if the sync fails, the previous snapshot is served.
+    Only the very first load, with nothing to serve, waits without a budget.
+    After a failure no new sync is tried for ``retry_after`` seconds.
+    """
+
+    def __init__(self, source, name="data", retry_after=10):
+        self.source = source
+        self.name = name
+        self.retry_after = retry_after
+        self.flight = SingleFlight()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"revalidate-{name}")
+        self.error = None
+        self.failed_at = 0.0
+
+    def get(self, max_age, budget=None):
+        snap = self.source.peek()
+        if snap is not None:
+            if not self.source.needs_sync(max_age):
+                return snap
+            if max_age and self.error and time.monotonic() - self.failed_at < self.retry_after:
+                return snap
+
+        fut = self.flight.submit((self.name, max_age), lambda: self._refresh(max_age), self.pool)
+        with span(f"revalidate {self.name}", "data", budget_ms=None if budget is None else budget * 1000) as sp:
+            try:
+                return fut.result(timeout=None if snap is None else budget)
+            except FutureTimeout:
+                sp["served_stale"] = True
+                return snap
+            except Exception:
+                if snap is None:
+                    raise
+                sp["served_stale"] = True
+                return snap
+
+    def _refresh(self, max_age):
+        try:
+            snap = self.source.refresh(max_age)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.failed_at = time.monotonic()
+            raise
+        self.error = None
+        return snap
+
+    def refreshing(self) -> bool:
+        return self.flight.busy()
+
+    def age(self):
+        """Seconds since the last successful sync, or None before the first."""
+        if not self.source.synced_at:
+            return None
+        return time.monotonic() - self.source.synced_at
+
+    def caption(self) -> str:
+        age = self.age()
+        parts = ["🕒 Data loading…" if age is None else f"🕒 Data from {age_text(age)} ago"]
+        if self.refreshing():
+            parts.append("refreshing in background")
+        if self.error:
+            parts.append(f"⚠️ last refresh failed ({self.error}), showing the last good data")
+        return " | ".join(parts)
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+import pyarrow as pa
+
+from tracing import span
+
+# =========================
+# Snapshots of the loaded frames (Arrow IPC), on disk or in Redis
+# =========================
+# A restarted process restores the last snapshot and then pulls only rows past
+# its watermark instead of downloading whole tables. In shared mode several
+# server processes (replicas) use one snapshot per table: each sync publishes
+# it, the others adopt it, and a lease elects the one replica that queries
+# Supabase when it has gone stale.
+#
+#   SNAPSHOTS=0               off
+#   SNAPSHOT_BACKEND=file     Arrow files in SNAPSHOT_DIR, memory-mapped, SQLite
+#                             leases; SNAPSHOT_SHARED=1 for replicas on one host
+#   SNAPSHOT_BACKEND=redis    REDIS_URL (needs the redis package); always shared
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots"))
+SNAPSHOTS_ENABLED = os.environ.get("SNAPSHOTS", "1") != "0"
+SNAPSHOT_BACKEND = os.environ.get("SNAPSHOT_BACKEND", "file")
+SNAPSHOT_SHARED = os.environ.get("SNAPSHOT_SHARED", "0") == "1"
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+# Minimum seconds between two saves of the same snapshot when not shared.
+SNAPSHOT_EVERY = 60
+# A refresher that died is replaced after this many seconds.
+LEASE_SECONDS = 120
+SNAPSHOT_FORMAT = 1
+
+
+def schema_tag(*schemas) -> str:
+    """Short hash of the column schemas; a snapshot written under another is ignored."""
+    raw = json.dumps([sorted((k, str(v)) for k, v in s.items()) for s in schemas])
+    return hashlib.sha1(f"{SNAPSHOT_FORMAT}:{raw}".encode()).hexdigest()[:12]
+
+
+def _ipc_bytes(table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# =========================
+# Backends
+# =========================
+class FileBackend:
+    """Arrow files plus a JSON manifest per snapshot in ``root``; leases in SQLite.
+
+    Files are uncompressed and memory-mapped. ``to_pandas`` copies numeric and
+    categorical columns into each process; only the Arrow-backed string
+    columns keep pointing at the mapped pages (shared by the replicas on one
+    host through the OS page cache) until a merge rebuilds the frame.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR, shared=False):
+        self.root = root
+        self.shared = shared
+        self._ready = False
+
+    def _manifest_path(self, name):
+        return os.path.join(self.root, f"{name}.json")
+
+    def read_manifest(self, name):
+        try:
+            with open(self._manifest_path(name), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read_table(self, name, fname):
+        # No read into process memory; string columns of the frame built from
+        # this table keep referencing the mapping.
+        return pa.ipc.open_file(pa.memory_map(os.path.join(self.root, fname))).read_all()
+
+    def write(self, name, tables: dict, manifest: dict):
+        os.makedirs(self.root, exist_ok=True)
+        for fname, table in tables.items():
+            tmp = os.path.join(self.root, fname + ".tmp")
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, os.path.join(self.root, fname))
+        self.write_manifest(name, manifest)
+        keep = set(manifest["files"].values())
+        for fname in os.listdir(self.root):
+            if fname.startswith(f"{name}-") and fname.endswith(".arrow") and fname not in keep:
+                try:
+                    os.remove(os.path.join(self.root, fname))
+                except OSError:
+                    pass  # still mapped elsewhere (Windows); removed by a later save
+
+    def write_manifest(self, name, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._manifest_path(name) + f".{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, default=str)
+        os.replace(tmp, self._manifest_path(name))
+
+    def _db(self):
+        os.makedirs(self.root, exist_ok=True)
+        db = sqlite3.connect(os.path.join(self.root, "leases.db"), timeout=10, isolation_level=None)
+        if not self._ready:
+            db.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, expires REAL)")
+            self._ready = True
+        return db
+
+    def acquire(self, key, owner, ttl) -> bool:
+        now = time.time()
+        with closing(self._db()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT owner, expires FROM leases WHERE key = ?", (key,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                db.execute("COMMIT")
+                return False
+            db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (key, owner, now + ttl))
+            db.execute("COMMIT")
+            return True
+
+    def release(self, key, owner):
+        with closing(self._db()) as db:
+            db.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+
+class RedisBackend:
+    """Snapshots and leases in Redis, through any redis-py compatible client
+    (``get``, ``set`` with ``nx``/``px``/``ex``, ``expire``, ``delete``)."""
+
+    shared = True
+
+    def __init__(self, client, prefix="mep:snap", ttl=86400, grace=120):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        # Superseded generations stay readable this long for replicas mid-load.
+        self.grace = grace
+
+    @classmethod
+    def from_url(cls, url=REDIS_URL, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    def read_manifest(self, name):
+        raw = self.client.get(self._key(name, "manifest"))
+        return json.loads(raw) if raw else None
+
+    def read_table(self, name, fname):
+        raw = self.client.get(self._key(name, fname))
+        if raw is None:
+            raise KeyError(fname)
+        return pa.ipc.open_file(pa.py_buffer(raw)).read_all()
+
+    def write(self, name, tables: dict, manifest: dict):
+        old = self.read_manifest(name)
+        for fname, table in tables.items():
+            self.client.set(self._key(name, fname), _ipc_bytes(table), ex=self.ttl)
+        self.write_manifest(name, manifest)
+        for fname in (old or {}).get("files", {}).values():
+            if fname not in manifest["files"].values():
+                self.client.expire(self._key(name, fname), self.grace)
+
+    def write_manifest(self, name, manifest):
+        self.client.set(self._key(name, "manifest"), json.dumps(manifest, default=str), ex=self.ttl)
+
+    def acquire(self, key, owner, ttl) -> bool:
+        return bool(self.client.set(self._key("lease", key), owner, nx=True, px=int(ttl * 1000)))
+
+    def release(self, key, owner):
+        # Not atomic: should the lease expire in between, a second refresher may
+        # briefly run as well, which only costs a duplicate sync.
+        raw = self.client.get(self._key("lease", key))
+        if raw is not None and (raw.decode() if isinstance(raw, bytes) else raw) == owner:
+            self.client.delete(self._key("lease", key))
+
+
+def backend_from_env():
+    """The configured backend, or None with SNAPSHOTS=0."""
+    if not SNAPSHOTS_ENABLED:
+        return None
+    if SNAPSHOT_BACKEND == "redis":
+        return RedisBackend.from_url(REDIS_URL)
+    return FileBackend(SNAPSHOT_DIR, shared=SNAPSHOT_SHARED)
+
+
+# =========================
+# Snapshot of one sync object
+# =========================
+class Snapshot:
+    """Named set of frames plus a manifest (generation, watermark, sync times, schema tag).
+
+    Each save writes a new generation and then swaps the manifest, so readers
+    (other processes too) always see a complete one. ``gen`` is the generation
+    this process holds, saved or adopted.
+    """
+
+    def __init__(self, name, tag, backend, every=SNAPSHOT_EVERY):
+        self.name = name
+        self.tag = tag
+        self.backend = backend
+        self.shared = backend.shared
+        self.every = 0 if self.shared else every
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.gen = None
+        self.seen_at = 0.0
+        self.saved_version = None
+        self.saved_at = None
+        self.error = None
+        self.lock = threading.Lock()
+
+    def _read(self, meta):
+        with span(f"snapshot load {self.name}", "data") as sp:
+            frames = {key: self.backend.read_table(self.name, fname).to_pandas() for key, fname in meta["files"].items()}
+            sp["rows"] = sum(len(df) for df in frames.values())
+        self.gen = meta["gen"]
+        self.seen_at = meta["saved_at"]
+        return frames
+
+    def _manifest(self):
+        meta = self.backend.read_manifest(self.name)
+        return meta if meta and meta.get("tag") == self.tag else None
+
+    def load(self):
+        """``(frames, meta)`` of the current snapshot, or None if there is no usable one."""
+        try:
+            meta = self._manifest()
+            return (self._read(meta), meta) if meta else None
+        except Exception as e:
+            self.error = f"load: {type(e).__name__}: {e}"
+            return None
+
+    def newer(self, patched_at=0.0):
+        """What another replica published since this one last looked.
+
+        ``(frames, meta)`` for a new generation to adopt, ``(None, meta)`` when
+        the held generation was re-confirmed by a later sync, else None. A
+        generation whose sync began before ``patched_at`` (this process's last
+        write-through) is skipped, as adopting it would undo that write.
+        """
+        try:
+            meta = self._manifest()
+            if meta is None or meta["saved_at"] <= self.seen_at:
+                return None
+            self.seen_at = meta["saved_at"]
+            if meta["gen"] == self.gen:
+                return None, meta
+            if meta["sync_started"] <= patched_at:
+                return None
+            return self._read(meta), meta
+        except Exception as e:
+            self.error = f"load: {type(e).__name__}: {e}"
+            return None
+
+    def synced_at(self, meta) -> float:
+        """A monotonic timestamp matching the snapshot's wall-clock save time."""
+        return time.monotonic() - max(0.0, time.time() - meta["saved_at"])
+
+    def save(self, frames: dict, meta: dict):
+        gen = uuid.uuid4().hex[:8]
+        files = {key: f"{self.name}-{gen}-{key}.arrow" for key in frames}
+        manifest = {
+            "sync_started": time.time(), **meta,
+            "gen": gen, "tag": self.tag, "saved_at": time.time(), "files": files, "by": self.owner,
+        }
+        with self.lock, span(f"snapshot save {self.name}", "data") as sp:
+            tables = {files[key]: pa.Table.from_pandas(df, preserve_index=False) for key, df in frames.items()}
+            self.backend.write(self.name, tables, manifest)
+            sp["rows"] = sum(len(df) for df in frames.values())
+        self.gen = gen
+        self.seen_at = manifest["saved_at"]
+
+    def _confirm(self, meta: dict):
+        # Same frames, later sync: only the manifest changes, so replicas holding
+        # this generation learn it is fresh without reloading it.
+        current = self._manifest()
+        if current is None or current["gen"] != self.gen:
+            return
+        manifest = {**current, **meta, "saved_at": time.time(), "by": self.owner}
+        self.backend.write_manifest(self.name, manifest)
+        self.seen_at = manifest["saved_at"]
+
+    def maybe_save(self, version, build):
+        """Save ``build()`` -> (frames, meta) if ``version`` is new and the last
+        save is at least ``every`` seconds old. Errors are kept, not raised."""
+        try:
+            if version == self.saved_version:
+                if self.shared and self.gen:
+                    self._confirm(build()[1])
+                return False
+            if self.saved_at is not None and time.monotonic() - self.saved_at < self.every:
+                return False
+            self.save(*build())
+        except Exception as e:
+            self.error = f"save: {type(e).__name__}: {e}"
+            return False
+        self.saved_version = version
+        self.saved_at = time.monotonic()
+        self.error = None
+        return True
+
+    def acquire(self) -> bool:
+        """Try to become the replica that refreshes this snapshot."""
+        try:
+            return self.backend.acquire(self.name, self.owner, LEASE_SECONDS)
+        except Exception as e:
+            # Without a working lease store every replica refreshes for itself.
+            self.error = f"lease: {type(e).__name__}: {e}"
+            return True
+
+    def release(self):
+        try:
+            self.backend.release(self.name, self.owner)
+        except Exception:
+            pass  # the lease expires by itself
@@ -0,0 +1,69 @@
+-- Race-free running numbers per issue category (P-001, D-001, ...) for ECLV2.
+-- reserve_category_seq bumps the counter row atomically and returns the first
+-- number of a block of p_count; the app may lease blocks to skip round trips.
+-- Run after issue_sync.sql (the renumbering below stamps changed_at).
+
+create table if not exists issue_category_seq (
+    category text primary key,
+    last_seq integer not null default 0
+);
+
+-- The old generator could give two issues the same number (concurrent
+-- submits, and a fallback to 001 on any error), which would stop the unique
+-- index below from being built. The oldest issue keeps each number; the others
+-- move to new numbers after the category's highest, and their display_no
+-- follows. Triggers are off so the renumbering does not count as an edit
+-- (updated_at is the completion date in exports); changed_at is stamped here
+-- so running apps pick the new numbers up with their next delta.
+alter table issue_escalation_v2 disable trigger user;
+
+with numbered as (
+    select id, category,
+           row_number() over (partition by category, category_seq order by id) as copy
+      from issue_escalation_v2
+     where category_seq is not null
+),
+moved as (
+    select n.id, n.category,
+           top.max_seq + row_number() over (partition by n.category order by n.id) as new_seq
+      from numbered n
+      join (
+            select category, max(category_seq) as max_seq
+              from issue_escalation_v2
+             group by category
+           ) top on top.category is not distinct from n.category
+     where n.copy > 1
+)
+update issue_escalation_v2 t
+   set category_seq = m.new_seq,
+       running_no = m.new_seq,
+       changed_at = now(),
+       display_no = case when t.category = 'Pending' then 'P-' else 'D-' end
+                    || case when m.new_seq < 1000 then lpad(m.new_seq::text, 3, '0') else m.new_seq::text end
+  from moved m
+ where t.id = m.id;
+
+alter table issue_escalation_v2 enable trigger user;
+
+-- Start each counter after the highest number already issued.
+insert into issue_category_seq (category, last_seq)
+select category, coalesce(max(category_seq), 0)
+  from issue_escalation_v2
+ where category is not null
+ group by category
+on conflict (category) do update
+   set last_seq = greatest(issue_category_seq.last_seq, excluded.last_seq);
+
+create or replace function reserve_category_seq(p_category text, p_count integer default 1)
+returns integer
+language sql
+as $$
+    insert into issue_category_seq as s (category, last_seq)
+    values (p_category, p_count)
+    on conflict (category) do update set last_seq = s.last_seq + excluded.last_seq
+    returning last_seq - p_count + 1;
+$$;
+
+-- Belt and braces: a duplicate number can never be stored.
+create unique index if not exists issue_escalation_v2_category_seq_key
+    on issue_escalation_v2 (category, category_seq);
@@ -0,0 +1,25 @@
+-- Atomic like counters used by the issue apps (ECLV1 / ECLV2).
+-- The apps buffer clicks in-process and call these once per record per flush
+-- with n = number of clicks, so concurrent likes are never lost.
+-- updated_at is left alone: it is the edit / completion time in exports. The
+-- ECLV2 sync still sees the new count through changed_at (sql/issue_sync.sql).
+
+create or replace function increment_issue_likes_v2(record_id bigint, n integer default 1)
+returns integer
+language sql
+as $$
+    update issue_escalation_v2
+       set likes = coalesce(likes, 0) + n
+     where id = record_id
+ returning likes;
+$$;
+
+create or replace function increment_issue_likes(record_id bigint, n integer default 1)
+returns integer
+language sql
+as $$
+    update issue_escalation
+       set likes = coalesce(likes, 0) + n
+     where id = record_id
+ returning likes;
+$$;
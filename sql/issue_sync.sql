@@ -0,0 +1,37 @@
+-- Change stamps for the ECLV2 delta sync (issue_store.IssueSync).
+-- The app pulls rows whose changed_at is at or past its high-water mark, so
+-- the stamp must come from the database for every writer: other apps, hand
+-- edits and app servers whose clocks drift. Values sent by a client are
+-- overwritten.
+--
+-- changed_at moves on every write, likes included. updated_at is the edit
+-- time the exports report as the Complete Date, so a like leaves it alone.
+
+alter table issue_escalation_v2
+    add column if not exists changed_at timestamptz not null default now();
+
+create or replace function issue_escalation_v2_touch()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.changed_at := now();
+    if tg_op = 'UPDATE'
+       and (to_jsonb(new) - 'likes' - 'updated_at' - 'changed_at')
+         = (to_jsonb(old) - 'likes' - 'updated_at' - 'changed_at') then
+        new.updated_at := old.updated_at;
+    else
+        new.updated_at := now();
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists issue_escalation_v2_touch on issue_escalation_v2;
+create trigger issue_escalation_v2_touch
+    before insert or update on issue_escalation_v2
+    for each row execute function issue_escalation_v2_touch();
+
+-- The delta is a range scan on the stamp.
+create index if not exists issue_escalation_v2_changed_at_idx
+    on issue_escalation_v2 (changed_at);
@@ -0,0 +1,4 @@
+-- Change feed for MJRV14: publish row changes of both tables to Supabase
+-- Realtime. Deletes only carry the primary key, which is all the app needs.
+
+alter publication supabase_realtime add table construction_progress, task_master;
@@ -0,0 +1,31 @@
+-- Task Master import for MJRV14. The app diffs the uploaded sheet against
+-- task_master by task_name and sends only the changes; import_task_master
+-- applies them in a single transaction, so readers never see a half-empty list.
+
+-- task_name is the import key; drop older duplicates before enforcing it.
+delete from task_master a
+ using task_master b
+ where a.task_name = b.task_name
+   and a.id > b.id;
+
+create unique index if not exists task_master_task_name_key
+    on task_master (task_name);
+
+create or replace function import_task_master(p_upserts jsonb, p_deletes text[] default '{}')
+returns void
+language plpgsql
+as $$
+begin
+    delete from task_master
+     where task_name = any(p_deletes);
+
+    insert into task_master (task_name, category, total_qty, unit)
+    select r.task_name, r.category, r.total_qty, r.unit
+      from jsonb_to_recordset(coalesce(p_upserts, '[]'::jsonb))
+           as r(task_name text, category text, total_qty numeric, unit text)
+        on conflict (task_name) do update
+       set category = excluded.category,
+           total_qty = excluded.total_qty,
+           unit = excluded.unit;
+end;
+$$;
@@ -0,0 +1,255 @@
+import contextvars
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# =========================
+# Per-rerun timing spans
+# =========================
+# Each script run opens a Trace; ``span()`` blocks inside it (data access,
+# transforms, render sections, and every HTTP request of db_client) are timed
+# with optional rows/bytes. Finished traces are kept for the admin waterfall
+# and appended to a rolling JSONL file of Chrome trace events.
+TRACE_DIR = os.environ.get("TRACE_DIR", os.path.join(tempfile.gettempdir(), "mep_traces"))
+TRACE_FILE = os.path.join(TRACE_DIR, "spans.jsonl")
+TRACE_FILE_MAX_BYTES = 20 * 1024 * 1024
+TRACE_HISTORY = 10
+TRACE_TO_FILE = os.environ.get("TRACE_TO_FILE", "1") != "0"
+
+_current = contextvars.ContextVar("trace", default=None)
+_parent = contextvars.ContextVar("trace_parent", default=None)
+_file_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, app, session=None):
+        self.app = app
+        self.session = session
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.thread = threading.get_ident()
+        self.spans = []
+        self.section = None
+        self.last = self.t0
+        self.total_ms = None
+        self.status = "running"
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.spans.append(record)
+            self.last = max(self.last, self.t0 + (record["start_ms"] + record["dur_ms"]) / 1000)
+
+    def summary(self) -> dict:
+        with self.lock:
+            spans = list(self.spans)
+        http = [s for s in spans if s["kind"] == "http"]
+        return {
+            "total_ms": self.total_ms,
+            "spans": len(spans),
+            "http_requests": len(http),
+            "http_ms": round(sum(s["dur_ms"] for s in http), 1),
+            "rows": sum(s.get("rows") or 0 for s in http),
+            "bytes": sum(s.get("bytes") or 0 for s in http),
+        }
+
+
+@contextmanager
+def span(name, kind="step", **attrs):
+    """Time a block in the current trace; a no-op when no trace is active.
+
+    Yields a dict; set ``rows`` / ``bytes`` (or other keys) on it inside the block.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield {}
+        return
+    record = {"name": name, "kind": kind, "parent": _parent.get(), "thread": threading.get_ident(), **attrs}
+    token = _parent.set(name)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        end = time.perf_counter()
+        _parent.reset(token)
+        record["start_ms"] = round((start - trace.t0) * 1000, 2)
+        record["dur_ms"] = round((end - start) * 1000, 2)
+        trace.add(record)
+
+
+def traced(name, kind="step"):
+    """Decorator form of ``span``."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(name, kind):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def render_section(name):
+    """Start a top-level render span that runs until the next section or the
+    end of the script, so page blocks need no extra indentation."""
+    trace = _current.get()
+    if trace is None:
+        return
+    _close_section(trace)
+    trace.section = (name, time.perf_counter())
+    trace.last = max(trace.last, trace.section[1])
+    _parent.set(name)
+
+
+def _close_section(trace, end=None):
+    if trace.section is None:
+        return
+    name, start = trace.section
+    trace.section = None
+    end = max(end or time.perf_counter(), start)
+    trace.add({
+        "name": name, "kind": "render", "parent": None, "thread": trace.thread,
+        "start_ms": round((start - trace.t0) * 1000, 2), "dur_ms": round((end - start) * 1000, 2),
+    })
+    if _current.get() is trace:
+        _parent.set(None)
+
+
+def submit_in_context(pool, fn, *args):
+    # Worker threads do not inherit context variables; without this the spans
+    # they record would be lost.
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def start_trace(app, state):
+    """Open a trace for this script run; ``state`` is st.session_state.
+
+    A run cut short by st.rerun()/st.stop() never reaches ``finish_trace``, so
+    the previous open trace is closed here first, ending at its last span.
+    """
+    if state.get("_trace_open") is not None:
+        finish_trace(state, status="interrupted")
+    trace = Trace(app, session=state.get("_trace_session") or uuid.uuid4().hex[:8])
+    state["_trace_session"] = trace.session
+    state["_trace_open"] = trace
+    _current.set(trace)
+    _parent.set(None)
+    return trace
+
+
+def finish_trace(state, status="ok"):
+    trace = state.get("_trace_open")
+    if trace is None:
+        return None
+    state["_trace_open"] = None
+    # An interrupted run ended somewhere after its last recorded span; the
+    # time until this rerun started belongs to the user, not the script.
+    end = trace.last if status == "interrupted" else time.perf_counter()
+    _close_section(trace, end)
+    if _current.get() is trace:
+        _current.set(None)
+    trace.total_ms = round((max(end, trace.last) - trace.t0) * 1000, 2)
+    trace.status = status
+    history = state.get("_trace_history") or []
+    state["_trace_history"] = (history + [trace])[-TRACE_HISTORY:]
+    if TRACE_TO_FILE:
+        try:
+            write_trace(trace)
+        except OSError:
+            pass
+    return trace
+
+
+# =========================
+# Rolling trace file
+# =========================
+def chrome_events(trace) -> list:
+    """The trace as Chrome trace-event dicts (complete events, microseconds)."""
+    base = trace.started * 1e6
+    events = [{
+        "name": f"{trace.app} rerun", "cat": "rerun", "ph": "X", "pid": trace.app, "tid": trace.session,
+        "ts": round(base), "dur": round((trace.total_ms or 0) * 1000),
+        "args": {"run_id": trace.run_id, "status": trace.status},
+    }]
+    for s in trace.spans:
+        args = {k: v for k, v in s.items() if k not in ("name", "kind", "start_ms", "dur_ms", "thread", "parent")}
+        events.append({
+            "name": s["name"], "cat": s["kind"], "ph": "X", "pid": trace.app,
+            "tid": trace.session if s["thread"] == trace.thread else f"{trace.session}/{s['thread'] % 10000}",
+            "ts": round(base + s["start_ms"] * 1000), "dur": round(s["dur_ms"] * 1000),
+            "args": {"run_id": trace.run_id, **args},
+        })
+    return events
+
+
+def write_trace(trace, path=TRACE_FILE, max_bytes=TRACE_FILE_MAX_BYTES):
+    lines = "".join(json.dumps(e, ensure_ascii=False, default=str) + "\n" for e in chrome_events(trace))
+    with _file_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+            os.replace(path, path + ".1")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+def jsonl_to_chrome(src=TRACE_FILE, dst=None) -> str:
+    """Wrap a spans.jsonl file as a JSON array for chrome://tracing / Perfetto."""
+    dst = dst or os.path.splitext(src)[0] + ".trace.json"
+    with open(src, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    with open(dst, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return dst
+
+
+# =========================
+# Admin panel
+# =========================
+def render_trace_panel(state):
+    """Waterfall of the previous rerun of this session (sidebar expander)."""
+    import plotly.graph_objects as go
+    import streamlit as st
+
+    history = state.get("_trace_history") or []
+    with st.expander("⏱️ Rerun timings"):
+        if not history:
+            st.caption("No finished rerun yet.")
+            return
+        trace = history[-1]
+        s = trace.summary()
+        st.caption(
+            f"Last rerun {s['total_ms']:.0f} ms ({trace.status}) | {s['http_requests']} requests, "
+            f"{s['http_ms']:.0f} ms in HTTP | {s['rows']} rows, {s['bytes'] / 1024:.0f} KB"
+        )
+        spans = sorted(trace.spans, key=lambda r: r["start_ms"])
+        if spans:
+            colors = {"http": "#E65100", "data": "#0047AB", "transform": "#1B5E20", "render": "#6A1B9A"}
+            labels = [f"{r['name']} [{r['kind']}]" for r in spans]
+            fig = go.Figure(go.Bar(
+                x=[r["dur_ms"] for r in spans], base=[r["start_ms"] for r in spans], y=labels,
+                orientation="h", marker_color=[colors.get(r["kind"], "#757575") for r in spans],
+                hovertext=[f"{r['dur_ms']:.1f} ms, rows={r.get('rows', '')}, bytes={r.get('bytes', '')}" for r in spans],
+            ))
+            fig.update_layout(
+                height=max(200, 18 * len(spans) + 60), margin=dict(l=0, r=0, t=10, b=20),
+                xaxis_title="ms since rerun start", yaxis=dict(autorange="reversed", automargin=True),
+                showlegend=False,
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        if len(history) > 1:
+            st.caption("Earlier reruns: " + ", ".join(f"{t.total_ms:.0f} ms" for t in history[-2::-1]))
+        if TRACE_TO_FILE:
+            st.caption(f"Spans are appended to `{TRACE_FILE}` (python -m tracing converts it for chrome://tracing).")
+
+
+if __name__ == "__main__":
+    import sys
+    print(jsonl_to_chrome(*sys.argv[1:3]))